@@ -0,0 +1,22 @@
+"""Модуль описания классов аутентификации."""
+from copy import copy
+
+from rest_framework.authentication import TokenAuthentication
+
+from .caches import token_cache
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кешированием пользователя в памяти процесса.
+    Запись сбрасывается при удалении токена (выход) и при сохранении или
+    удалении пользователя (смена пароля, деактивация).
+    """
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is None:
+            entry = super().authenticate_credentials(key)
+            token_cache.set(key, entry)
+        user, token = entry
+        return copy(user), token
@@ -0,0 +1,120 @@
+"""Модуль описания кешей, хранимых в памяти процесса."""
+from collections import OrderedDict
+from hashlib import md5
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+REFERENCE_CACHE_MAX_ENTRIES = 1024
+
+
+class ReferenceCache:
+    """
+    Кеш отрендеренных ответов справочных эндпоинтов.
+    Хранит байты ответа и строгий ETag (хеш содержимого) для каждого ключа
+    запроса. Версия кеша увеличивается при изменении данных (по сигналам)
+    и по истечении времени жизни - для изменений из других процессов;
+    при смене версии все записи сбрасываются.
+    """
+
+    def __init__(self, ttl: int, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self._lock = Lock()
+        self._entries = {}
+        self._reset_at = monotonic()
+
+    def invalidate(self) -> None:
+        """Увеличивает версию кеша и сбрасывает записи."""
+        with self._lock:
+            self.version += 1
+            self._entries = {}
+            self._reset_at = monotonic()
+
+    def get(self, key) -> tuple:
+        """Возвращает пару (ETag, содержимое) или None."""
+        if monotonic() - self._reset_at > self.ttl:
+            self.invalidate()
+        return self._entries.get(key)
+
+    def set(self, key, content: bytes) -> tuple:
+        """Сохраняет содержимое ответа, возвращает пару (ETag, содержимое)."""
+        entry = (f'"{md5(content).hexdigest()}"', content)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = entry
+        return entry
+
+
+class TokenCache:
+    """
+    Кеш соответствия токена авторизации пользователю.
+    Ограничен по количеству записей (вытесняются давно не использованные)
+    и по времени жизни записи - для изменений из других процессов.
+    Ведёт счётчики попаданий и промахов.
+    """
+
+    def __init__(self, ttl: int, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> tuple:
+        """Возвращает пару (пользователь, токен) или None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: tuple) -> None:
+        """Сохраняет пару (пользователь, токен)."""
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        """Удаляет запись токена."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Удаляет записи всех токенов пользователя."""
+        with self._lock:
+            for key, (_, (user, _)) in list(self._entries.items()):
+                if user.pk == user_id:
+                    del self._entries[key]
+
+    def stats(self) -> dict:
+        """Счётчики кеша."""
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+tag_cache = ReferenceCache(
+    ttl=settings.REFERENCE_CACHE_TTL,
+    max_entries=REFERENCE_CACHE_MAX_ENTRIES,
+)
+ingredient_cache = ReferenceCache(
+    ttl=settings.REFERENCE_CACHE_TTL,
+    max_entries=REFERENCE_CACHE_MAX_ENTRIES,
+)
+token_cache = TokenCache(
+    ttl=settings.TOKEN_CACHE_TTL,
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES,
+)
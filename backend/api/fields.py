@@ -0,0 +1,112 @@
+"""Модуль описания полей сериализаторов."""
+import binascii
+from base64 import b64decode
+from string import whitespace
+from tempfile import TemporaryFile
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+from rest_framework.serializers import ImageField
+
+BASE64_HEADER = ';base64,'
+BASE64_CHUNK = 64 * 1024
+# Переносы строк и пробелы допустимы в base64 (формат MIME) и удаляются.
+BASE64_WHITESPACE = str.maketrans('', '', whitespace)
+
+
+class RecipeImageField(ImageField):
+    """
+    Поле изображения рецепта: принимает строку base64 (с заголовком
+    data URI или без него) или загруженный файл.
+    Размер проверяется до декодирования, строка декодируется порциями во
+    временный файл на диске, размеры в пикселях проверяются по заголовку
+    изображения до его проверки. Файл целиком в память не читается.
+    """
+    ALLOWED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif',
+                       'WEBP': 'webp'}
+    default_error_messages = {
+        'too_large': 'Размер изображения превышает {max_size} байт.',
+        'too_many_pixels': (
+            'Изображение больше {max_pixels} пикселей.'
+        ),
+        'invalid_format': 'Допустимые форматы: JPEG, PNG, GIF, WEBP.',
+        'invalid_base64': 'Некорректная строка base64.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = self.decode(data)
+        elif not hasattr(data, 'size'):
+            self.fail('invalid')
+        elif data.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        if not data.size:
+            self.fail('empty')
+        data.name = f'{uuid4()}.{self.check_header(data)}'
+        return data
+
+    def decode(self, value: str) -> File:
+        """
+        Декодирует строку base64 во временный файл порциями.
+        Пробельные символы ASCII пропускаются, остальные символы вне
+        алфавита base64 считаются ошибкой.
+        """
+        offset = value.find(BASE64_HEADER)
+        offset = 0 if offset < 0 else offset + len(BASE64_HEADER)
+        length = len(value) - offset - sum(
+            value.count(char, offset) for char in whitespace
+        )
+        padding = value.rstrip(whitespace)[-2:].count('=')
+        if length // 4 * 3 - padding > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        file = File(TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR))
+        rest = ''
+        try:
+            for start in range(offset, len(value), BASE64_CHUNK):
+                chunk = rest + value[
+                    start:start + BASE64_CHUNK
+                ].translate(BASE64_WHITESPACE)
+                end = len(chunk) - len(chunk) % 4
+                file.write(b64decode(chunk[:end], validate=True))
+                rest = chunk[end:]
+            if rest:
+                b64decode(rest, validate=True)
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def check_header(self, file) -> str:
+        """
+        Проверяет формат и размеры изображения по заголовку, затем
+        целостность файла. Возвращает расширение файла.
+        """
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+                width, height = image.size
+                pixels = width * height
+                if (image_format in self.ALLOWED_FORMATS
+                        and pixels <= settings.RECIPE_IMAGE_MAX_PIXELS):
+                    image.verify()
+        except Image.DecompressionBombError:
+            self.fail(
+                'too_many_pixels',
+                max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS
+            )
+        except Exception:
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if image_format not in self.ALLOWED_FORMATS:
+            self.fail('invalid_format')
+        if pixels > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail(
+                'too_many_pixels',
+                max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS
+            )
+        return self.ALLOWED_FORMATS[image_format]
@@ -1,20 +1,20 @@
 """Модуль описания фильтров."""
-from django_filters.rest_framework import (AllValuesMultipleFilter,
-                                           BooleanFilter, CharFilter,
-                                           FilterSet, NumberFilter)
-from recipe.models import Ingredient, Recipe
+from django.db.models import Exists, OuterRef
+from django_filters.rest_framework import (BooleanFilter, CharFilter,
+                                           ChoiceFilter, FilterSet,
+                                           MultipleChoiceFilter, NumberFilter)
+from recipe.models import Recipe
 
+from .indexes import tag_index
 
-class IngredientFilter(FilterSet):
-    """
-    Фильтрсет для ингредиентов.
-    Отбирает по вхождению текста в начало названия.
-    """
-    name = CharFilter(lookup_expr='istartswith')
 
-    class Meta:
-        model = Ingredient
-        fields = ('name', )
+# Порядок сортировки "popular", поддержан индексом "recipe_popular_idx".
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
+
+
+def tag_choices() -> list:
+    """Варианты выбора тегов из индекса тегов в памяти процесса."""
+    return tag_index.choices()
 
 
 class RecipeFilter(FilterSet):
@@ -24,7 +24,12 @@ class RecipeFilter(FilterSet):
     - в избранном у текущего пользователя;
     - в корзине у текущего пользователя;
     - автор;
-    - множественный фильтр по наличию тегов.
+    - множественный фильтр по наличию тегов;
+    - полнотекстовый поиск по названию и описанию.
+    Сортировка "popular" - по количеству добавлений в избранное.
+    Отборы по связям выполняются подзапросами EXISTS к промежуточным
+    таблицам: переданная выборка только сужается, строки не дублируются
+    и DISTINCT не требуется.
     """
     is_favorited = BooleanFilter(
         method='get_is_favorited',
@@ -36,8 +41,16 @@ class RecipeFilter(FilterSet):
         field_name='author__id',
         lookup_expr='exact'
     )
-    tags = AllValuesMultipleFilter(
-        field_name='tags__slug',
+    tags = MultipleChoiceFilter(
+        choices=tag_choices,
+        method='get_tags',
+    )
+    search = CharFilter(
+        method='get_search',
+    )
+    ordering = ChoiceFilter(
+        choices=(('popular', 'По популярности'), ),
+        method='get_ordering',
     )
 
     class Meta:
@@ -46,19 +59,62 @@ class RecipeFilter(FilterSet):
             'is_favorited',
             'is_in_shopping_cart',
             'author',
-            'tags'
+            'tags',
+            'search',
+            'ordering'
         )
 
     def get_is_favorited(self, queryset, name, value):
         """Функция фильтра по наличию в избранном у текущего пользователя"""
         user = self.request.user
-        if value:
-            return Recipe.objects.filter(favorite=user)
-        return Recipe.objects.all()
+        if value and user.is_authenticated:
+            return queryset.filter(Exists(
+                Recipe.favorite.through.objects.filter(
+                    recipe=OuterRef('pk'),
+                    foodgramuser=user,
+                )
+            ))
+        return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         """Функция фильтра по наличию в корзине у текущего пользователя"""
         user = self.request.user
-        if value:
-            return Recipe.objects.filter(shopping_cart=user)
-        return Recipe.objects.all()
+        if value and user.is_authenticated:
+            return queryset.filter(Exists(
+                Recipe.shopping_cart.through.objects.filter(
+                    recipe=OuterRef('pk'),
+                    foodgramuser=user,
+                )
+            ))
+        return queryset
+
+    def get_tags(self, queryset, name, value):
+        """
+        Функция фильтра по наличию хотя бы одного из тегов.
+        Slug заменяются на id по индексу тегов, поэтому подзапрос
+        обращается только к промежуточной таблице.
+        """
+        if not value:
+            return queryset
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag_id__in=tag_index.ids(value),
+            )
+        ))
+
+    def get_search(self, queryset, name, value):
+        """
+        Функция поиска по словам в названии и описании рецепта.
+        Результаты упорядочены по релевантности.
+        """
+        if not value.strip():
+            return queryset
+        return queryset.search(value)
+
+    def get_ordering(self, queryset, name, value):
+        """
+        Функция сортировки рецептов. Популярность берётся из счётчика
+        "favorites_count" и поддержана индексом.
+        """
+        return queryset.order_by(*POPULAR_ORDERING)
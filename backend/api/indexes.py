@@ -0,0 +1,121 @@
+"""Модуль описания индексов, хранимых в памяти процесса."""
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+from recipe.models import Ingredient, Tag
+
+
+def normalize_name(value: str) -> str:
+    """Приводит название к виду, используемому для поиска."""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class MemoryIndex:
+    """
+    Основа индексов справочников в памяти процесса.
+    Индекс строится при первом обращении и перестраивается после изменения
+    таблицы в текущем процессе либо по истечении времени жизни, чтобы
+    подхватить изменения, сделанные другими процессами.
+    """
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        self._lock = Lock()
+        self._data = None
+        self._loaded_at = 0.0
+
+    def invalidate(self) -> None:
+        """Помечает индекс устаревшим."""
+        self._data = None
+
+    def _build(self):
+        """Загружает данные индекса из БД."""
+        raise NotImplementedError
+
+    def _get_data(self):
+        """Возвращает актуальные данные индекса."""
+        data = self._data
+        if data is None or monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                if self._data is data:
+                    self._data = self._build()
+                    self._loaded_at = monotonic()
+                data = self._data
+        return data
+
+
+class IngredientIndex(MemoryIndex):
+    """
+    Индекс ингредиентов для автодополнения.
+    Хранит отсортированный список нормализованных названий, поиск по началу
+    названия выполняется бинарным поиском, совпадения внутри названия
+    выводятся после совпадений по началу.
+    """
+
+    def _build(self) -> tuple:
+        """Загружает ингредиенты из БД одним запросом."""
+        rows = Ingredient.objects.values('id', 'measurement_unit', 'name')
+        items = sorted(
+            ((normalize_name(row['name']), row) for row in rows),
+            key=lambda item: item[0]
+        )
+        keys = tuple(key for key, _ in items)
+        rows = tuple(row for _, row in items)
+        return keys, rows
+
+    def all(self) -> list:
+        """Возвращает все ингредиенты."""
+        _, rows = self._get_data()
+        return list(rows)
+
+    def search(self, query: str, limit: int) -> list:
+        """
+        Возвращает не более "limit" ингредиентов, название которых
+        начинается с "query", затем содержащих "query".
+        """
+        keys, rows = self._get_data()
+        query = normalize_name(query)
+        result = []
+        index = bisect_left(keys, query)
+        while (
+            index < len(keys)
+            and keys[index].startswith(query)
+            and len(result) < limit
+        ):
+            result.append(rows[index])
+            index += 1
+        if len(result) < limit:
+            for key, row in zip(keys, rows):
+                if query in key and not key.startswith(query):
+                    result.append(row)
+                    if len(result) >= limit:
+                        break
+        return result
+
+
+class TagIndex(MemoryIndex):
+    """
+    Индекс тегов: соответствие slug -> id.
+    Используется фильтром рецептов, чтобы проверять переданные slug и
+    отбирать рецепты по id тегов без обращения к таблице тегов.
+    """
+
+    def _build(self) -> dict:
+        """Загружает теги из БД одним запросом."""
+        return dict(Tag.objects.values_list('slug', 'id'))
+
+    def choices(self) -> list:
+        """Возвращает варианты выбора для поля фильтра."""
+        return [(slug, slug) for slug in sorted(self._get_data())]
+
+    def ids(self, slugs) -> list:
+        """Возвращает id тегов по списку slug, неизвестные пропускаются."""
+        data = self._get_data()
+        return [data[slug] for slug in slugs if slug in data]
+
+
+ingredient_index = IngredientIndex(ttl=settings.INGREDIENT_INDEX_TTL)
+tag_index = TagIndex(ttl=settings.REFERENCE_CACHE_TTL)
@@ -0,0 +1,345 @@
+"""
+Команда замера времени ответа и количества SQL-запросов всех путей
+приложения "api". Запросы выполняются тестовым клиентом Django в текущем
+процессе от имени пользователя, созданного командой generate_data.
+Изменяющие данные шаги выполняются парами, поэтому данные после прогона
+остаются прежними.
+"""
+import json
+from base64 import b64encode
+from io import BytesIO
+from math import ceil
+from pathlib import Path
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import URLResolver, resolve
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.middleware import QueryStats, get_query_budget
+from api.urls import urlpatterns
+from recipe.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+P95_NOISE_MS = 5
+
+STEPS = (
+    ('login', 'post', '/api/auth/token/login/', 'login', 200),
+    ('api root', 'get', '/api/', None, 200),
+    ('tags', 'get', '/api/tags/', None, 200),
+    ('tag', 'get', '/api/tags/{tag}/', None, 200),
+    ('ingredient search', 'get', '/api/ingredients/?name={prefix}', None,
+     200),
+    ('ingredient', 'get', '/api/ingredients/{ingredient}/', None, 200),
+    ('recipes', 'get', '/api/recipes/', None, 200),
+    ('recipes by tag', 'get', '/api/recipes/?tags={slug}&is_favorited=1',
+     None, 200),
+    ('recipes popular', 'get', '/api/recipes/?ordering=popular', None, 200),
+    ('recipes cursor', 'get', '/api/recipes/?cursor=', None, 200),
+    ('recipe', 'get', '/api/recipes/{recipe}/', None, 200),
+    ('recipe create', 'post', '/api/recipes/', 'recipe', 201),
+    ('recipe update', 'patch', '/api/recipes/{created}/', 'recipe', 200),
+    ('recipe image', 'put', '/api/recipes/{created}/image/', 'image', 200),
+    ('favorite add', 'post', '/api/recipes/{created}/favorite/', None, 201),
+    ('favorite remove', 'delete', '/api/recipes/{created}/favorite/', None,
+     204),
+    ('cart add', 'post', '/api/recipes/{created}/shopping_cart/', None, 201),
+    ('cart summary', 'get', '/api/recipes/shopping_cart_summary/', None,
+     200),
+    ('cart download', 'get', '/api/recipes/download_shopping_cart/', None,
+     200),
+    ('cart remove', 'delete', '/api/recipes/{created}/shopping_cart/', None,
+     204),
+    ('favorite bulk add', 'post', '/api/recipes/favorite/', 'recipes', 200),
+    ('favorite bulk remove', 'delete', '/api/recipes/favorite/', 'recipes',
+     200),
+    ('cart bulk add', 'post', '/api/recipes/shopping_cart/', 'recipes', 200),
+    ('cart bulk remove', 'delete', '/api/recipes/shopping_cart/', 'recipes',
+     200),
+    ('recipe delete', 'delete', '/api/recipes/{created}/', None, 204),
+    ('users', 'get', '/api/users/', None, 200),
+    ('user', 'get', '/api/users/{author}/', None, 200),
+    ('me', 'get', '/api/users/me/', None, 200),
+    ('subscriptions', 'get', '/api/users/subscriptions/', None, 200),
+    ('subscribe', 'post', '/api/users/{author}/subscribe/', None, 201),
+    ('unsubscribe', 'delete', '/api/users/{author}/subscribe/', None, 204),
+    ('subscribe bulk', 'post', '/api/users/subscribe/', 'authors', 200),
+    ('unsubscribe bulk', 'delete', '/api/users/subscribe/', 'authors', 200),
+    ('cache stats', 'get', '/api/stats/caches/', None, 403),
+    ('logout', 'post', '/api/auth/token/logout/', None, 204),
+)
+
+
+def route_names(patterns) -> set:
+    """Имена всех путей из списка "patterns", включая вложенные."""
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def percentile(values: list, share: float) -> float:
+    """Процентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(ceil(share * len(ordered)) - 1, 0)]
+
+
+def png_image() -> bytes:
+    """Небольшое изображение для шагов с загрузкой картинки."""
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), (205, 133, 63)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks every api route: p50/p95 latency and SQL queries. '
+            'Creates and deletes a recipe on each iteration')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email', default='bench_0@example.com',
+            help='Email of the user to log in as '
+                 '(default: bench_0@example.com)',
+        )
+        parser.add_argument(
+            '--password', default='bench-password',
+            help='Password of the user (default: bench-password)',
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=20,
+            help='Measured iterations (default: 20)',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Iterations run before measuring (default: 2)',
+        )
+        parser.add_argument(
+            '--output', type=Path,
+            help='Save results to a JSON file',
+        )
+        parser.add_argument(
+            '--baseline', type=Path,
+            help='Fail on regressions against a saved JSON file',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=1.5,
+            help='Allowed p95 growth against the baseline (default: 1.5)',
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Fail on unexpected statuses and exceeded query budgets',
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(
+                f'User {options["email"]} not found, run generate_data first'
+            )
+        context = self.get_context(user, options)
+        client = APIClient()
+        results = {
+            label: {'times': [], 'queries': 0, 'errors': 0}
+            for label, *_ in STEPS
+        }
+        for iteration in range(options['warmup'] + options['iterations']):
+            measured = iteration >= options['warmup']
+            self.run_iteration(client, context, results if measured else {})
+        for name in context['files']:
+            default_storage.delete(name)
+
+        report = self.report(results)
+        if options['output']:
+            options['output'].write_text(json.dumps(report, indent=2))
+        uncovered = route_names(urlpatterns) - context['routes']
+        if uncovered:
+            self.stdout.write(
+                f'Not benchmarked: {", ".join(sorted(uncovered))}'
+            )
+        failures = []
+        if options['check']:
+            failures += self.check_report(report)
+        if options['baseline']:
+            failures += self.compare(
+                report,
+                json.loads(options['baseline'].read_text()),
+                options['tolerance']
+            )
+        if failures:
+            raise CommandError('Benchmark failed:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Benchmark finished'))
+
+    def get_context(self, user, options) -> dict:
+        """Объекты, на которые ссылаются шаги прогона."""
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        author = User.objects.exclude(pk=user.pk).exclude(
+            followers=user
+        ).order_by('id').first()
+        if None in (tag, ingredient, recipe, author):
+            raise CommandError('Not enough data, run generate_data first')
+        return {
+            'user': user,
+            'password': options['password'],
+            'tag': tag.id,
+            'slug': tag.slug,
+            'ingredient': ingredient.id,
+            'prefix': ingredient.name[:2],
+            'recipe': recipe.id,
+            'author': author.id,
+            'created': None,
+            'image': b64encode(png_image()).decode(),
+            'files': set(),
+            'routes': set(),
+        }
+
+    def payload(self, kind, context: dict):
+        """Тело запроса шага и его формат."""
+        if kind == 'login':
+            return {
+                'email': context['user'].email,
+                'password': context['password'],
+            }, 'json'
+        if kind == 'recipe':
+            return {
+                'name': f'benchmark {perf_counter()}',
+                'text': 'benchmark',
+                'cooking_time': 10,
+                'tags': [context['tag']],
+                'ingredients': [
+                    {'id': context['ingredient'], 'amount': 100}
+                ],
+                'image': f'data:image/png;base64,{context["image"]}',
+            }, 'json'
+        if kind == 'recipes':
+            return {'ids': [context['created']]}, 'json'
+        if kind == 'authors':
+            return {'ids': [context['author']]}, 'json'
+        if kind == 'image':
+            image = BytesIO(png_image())
+            image.name = 'benchmark.png'
+            return {'image': image}, 'multipart'
+        return None, None
+
+    def run_iteration(self, client, context: dict, results: dict):
+        """Выполняет все шаги по порядку и записывает замеры."""
+        for label, method, path, kind, status in STEPS:
+            path = path.format(**context)
+            data, data_format = self.payload(kind, context)
+            stats = QueryStats()
+            started = perf_counter()
+            with connection.execute_wrapper(stats):
+                if method == 'get':
+                    response = client.get(path)
+                else:
+                    response = getattr(client, method)(
+                        path, data, format=data_format
+                    )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            elapsed = perf_counter() - started
+            context['routes'].add(resolve(path.split('?')[0]).url_name)
+            self.after_step(client, context, label, response)
+            if label not in results:
+                continue
+            result = results[label]
+            result['method'] = method.upper()
+            result['path'] = path
+            result['times'].append(elapsed)
+            result['queries'] = max(result['queries'], stats.count)
+            result['errors'] += response.status_code != status
+
+    def after_step(self, client, context: dict, label: str, response):
+        """Переносит результаты шага в контекст следующих шагов."""
+        if label == 'login' and response.status_code == 200:
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}'
+            )
+        if label == 'recipe create' and response.status_code == 201:
+            context['created'] = response.data['id']
+        if label in ('recipe create', 'recipe image'):
+            context['files'].update(
+                Recipe.objects.filter(pk=context['created']).values_list(
+                    'image', flat=True
+                )
+            )
+        if label == 'logout':
+            client.credentials()
+
+    def report(self, results: dict) -> dict:
+        """Выводит таблицу замеров и возвращает её в виде словаря."""
+        report = {}
+        self.stdout.write(
+            f'{"step":<22}{"p50 ms":>9}{"p95 ms":>9}{"queries":>9}'
+            f'{"budget":>8}{"errors":>8}'
+        )
+        for label, method, *_ in STEPS:
+            result = results[label]
+            path = result['path']
+            _, budget = get_query_budget(
+                resolve(path.split('?')[0]).func, result['method']
+            )
+            report[label] = {
+                'method': result['method'],
+                'path': path,
+                'p50_ms': round(percentile(result['times'], 0.5) * 1000, 2),
+                'p95_ms': round(percentile(result['times'], 0.95) * 1000, 2),
+                'queries': result['queries'],
+                'budget': budget,
+                'errors': result['errors'],
+            }
+            row = report[label]
+            self.stdout.write(
+                f'{label:<22}{row["p50_ms"]:>9}{row["p95_ms"]:>9}'
+                f'{row["queries"]:>9}{str(budget or "-"):>8}'
+                f'{row["errors"]:>8}'
+            )
+        return report
+
+    def check_report(self, report: dict) -> list:
+        """Ошибки ответов и превышения бюджетов запросов."""
+        failures = []
+        for label, row in report.items():
+            if row['errors']:
+                failures.append(
+                    f'{label}: {row["errors"]} unexpected responses'
+                )
+            if row['budget'] is not None and row['queries'] > row['budget']:
+                failures.append(
+                    f'{label}: {row["queries"]} queries, '
+                    f'budget {row["budget"]}'
+                )
+        return failures
+
+    def compare(self, report: dict, baseline: dict,
+                tolerance: float) -> list:
+        """
+        Регрессии относительно сохранённых результатов. Рост p95 меньше
+        P95_NOISE_MS не учитывается.
+        """
+        failures = []
+        for label, row in report.items():
+            base = baseline.get(label)
+            if base is None:
+                continue
+            if row['queries'] > base['queries']:
+                failures.append(
+                    f'{label}: {row["queries"]} queries, '
+                    f'baseline {base["queries"]}'
+                )
+            if (row['p95_ms'] > base['p95_ms'] * tolerance
+                    and row['p95_ms'] - base['p95_ms'] > P95_NOISE_MS):
+                failures.append(
+                    f'{label}: p95 {row["p95_ms"]} ms, '
+                    f'baseline {base["p95_ms"]} ms'
+                )
+        return failures
@@ -0,0 +1,157 @@
+"""
+Команда проверки планов выполнения основных запросов API.
+Запросы строятся теми же наборами запросов и фильтрами, что и во вьюсетах,
+для пользователя и автора из данных, созданных командой generate_data.
+Для каждого запроса выводится план (EXPLAIN), команда завершается ошибкой,
+если в плане есть последовательное чтение большой таблицы.
+Запросы подсчёта общего количества объектов не проверяются: им нужно
+прочитать всю выборку независимо от индексов.
+"""
+import re
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+
+from api.filters import RecipeFilter
+from api.utils import shopping_list_ingredients
+from recipe.models import Ingredient, Recipe
+
+User = get_user_model()
+
+# Последовательное чтение таблицы: PostgreSQL - "Seq Scan on <таблица>",
+# SQLite - "SCAN <таблица или псевдоним>" без использования индекса.
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)$'),
+}
+# Псевдонимы таблиц в подзапросах Django: "<таблица>" U0.
+ALIAS = re.compile(r'"(\w+)" (U\d+)\b')
+
+
+def seq_scan_tables(plan: str, sql: str, vendor: str) -> set:
+    """Таблицы, читаемые в плане последовательно."""
+    aliases = {}
+    for table, alias in ALIAS.findall(sql):
+        aliases.setdefault(alias, set()).add(table)
+    tables = set()
+    for line in plan.splitlines():
+        match = SEQ_SCAN[vendor].search(line.strip())
+        if match:
+            name = match.group(1)
+            tables |= aliases.get(name, {name})
+    return tables
+
+
+def table_rows(table: str) -> int:
+    """Количество строк в таблице."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}'
+        )
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = 'Checks query plans of the main API queries for sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Tables with fewer rows may be scanned (default: 1000)',
+        )
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Username prefix of generated users (default: bench)',
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Print query plans',
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in SEQ_SCAN:
+            raise CommandError(f'Database "{vendor}" is not supported')
+        if vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        failures = []
+        rows = {}
+        for label, queryset, allowed in self.queries(options['prefix']):
+            plan = queryset.explain()
+            tables = seq_scan_tables(plan, str(queryset.query), vendor)
+            for table in tables - rows.keys():
+                rows[table] = table_rows(table)
+            big = sorted(
+                table for table in tables - set(allowed)
+                if rows[table] >= options['min_rows']
+            )
+            status = 'seq scan: ' + ', '.join(big) if big else 'ok'
+            self.stdout.write(f'{label:<28} {status}')
+            if options['verbose_plans'] or big:
+                self.stdout.write(plan)
+            if big:
+                failures.append(f'{label}: {", ".join(big)}')
+        if failures:
+            raise CommandError(
+                'Sequential scans of big tables:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('Query plans are fine'))
+
+    def queries(self, prefix: str) -> list:
+        """
+        Проверяемые запросы: название, набор запросов и таблицы, которые
+        допустимо читать последовательно.
+        """
+        generated = User.objects.filter(username__startswith=f'{prefix}_')
+        user = generated.annotate(
+            favorites_total=Count('favorites')
+        ).order_by('-favorites_total').first()
+        author = generated.order_by('-followers_count').first()
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        tag = recipe.tags.first() if recipe else None
+        if user is None or recipe is None or tag is None:
+            raise CommandError('Not enough data, run generate_data first')
+        size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        request = SimpleNamespace(user=user)
+
+        def recipes(**data):
+            return RecipeFilter(
+                data, Recipe.objects.for_user(user), request=request
+            ).qs[:size]
+
+        return [
+            ('recipes', recipes(), ()),
+            ('recipes next page', Recipe.objects.for_user(user).filter(
+                Q(pub_date__lt=recipe.pub_date)
+                | Q(pub_date=recipe.pub_date, id__lt=recipe.id)
+            ).order_by('-pub_date', '-id')[:size], ()),
+            ('recipes by author', recipes(author=author.id), ()),
+            ('recipes by tag', recipes(tags=[tag.slug]), ()),
+            ('recipes favorited', recipes(is_favorited='1'), ()),
+            ('recipes in cart', recipes(is_in_shopping_cart='1'), ()),
+            ('recipes popular', recipes(ordering='popular'), ()),
+            ('recipe', Recipe.objects.for_user(user).filter(pk=recipe.id),
+             ()),
+            ('subscriptions', User.objects.filter(followers=user)[:size], ()),
+            ('subscription recipes', Recipe.objects.filter(
+                author__in=User.objects.filter(followers=user)[:size]
+            ).latest_per_author(3), ()),
+            ('author followers', User.subscription.through.objects.filter(
+                to_foodgramuser=author
+            ), ()),
+            ('recipe favorited by', Recipe.favorite.through.objects.filter(
+                recipe=recipe
+            ), ()),
+            # Справочник ингредиентов невелик и соединяется с итогами списка
+            # покупок хешем целиком, это дешевле поиска по ключу.
+            ('shopping list', shopping_list_ingredients(user),
+             (Ingredient._meta.db_table, )),
+            ('ingredient prefix', Ingredient.objects.filter(
+                name__istartswith=recipe.ingredients.first().name[:3]
+            )[:size], ()),
+        ]
@@ -0,0 +1,434 @@
+"""
+Команда нагрузочного тестирования запущенного сервера (например,
+gunicorn из infra/) смешанным потоком запросов. Каждый поток выполняет
+взвешенные сценарии пользователей, созданных командой generate_data, от
+имени своего пользователя. Отдельная фаза гонок отправляет одинаковые
+запросы добавления/удаления одновременно и проверяет, что ровно один из
+них выполнен успешно, а остальные получили 400.
+"""
+import json
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from threading import Barrier, Lock
+from time import monotonic, perf_counter
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark import percentile
+
+TOGGLES = {
+    'favorite': ('recipes', 'is_favorited'),
+    'shopping_cart': ('recipes', 'is_in_shopping_cart'),
+    'subscribe': ('users', 'is_subscribed'),
+}
+
+
+class LoadStats:
+    """Потокобезопасный сбор времени ответов и статусов по шагам."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.times = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.journeys = Counter()
+        self.races = []
+        self.crashes = []
+
+    def add(self, label: str, elapsed: float, status: int, ok: bool):
+        with self.lock:
+            self.times[label].append(elapsed)
+            self.statuses[label][status] += 1
+            self.errors[label] += not ok
+
+    def total(self) -> int:
+        """Количество выполненных запросов."""
+        with self.lock:
+            return sum(len(times) for times in self.times.values())
+
+
+class Client:
+    """Сессия пользователя: выполняет шаги и записывает замеры."""
+
+    def __init__(self, base_url: str, stats: LoadStats, timeout: float):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.user_id = None
+
+    def step(self, label: str, method: str, path: str, expected=(200, ),
+             **kwargs):
+        """
+        Выполняет запрос и возвращает ответ или "None" при сетевой ошибке
+        (записывается со статусом 0).
+        """
+        started = perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, timeout=self.timeout, **kwargs
+            )
+        except requests.RequestException:
+            response = None
+        status = response.status_code if response is not None else 0
+        self.stats.add(
+            label, perf_counter() - started, status, status in expected
+        )
+        return response
+
+    def login(self, email: str, password: str) -> bool:
+        response = self.step(
+            'login', 'POST', '/api/auth/token/login/',
+            json={'email': email, 'password': password},
+        )
+        if response is None or response.status_code != 200:
+            return False
+        self.session.headers['Authorization'] = (
+            f'Token {response.json()["auth_token"]}'
+        )
+        response = self.step('me', 'GET', '/api/users/me/')
+        if response is None or response.status_code != 200:
+            return False
+        self.user_id = response.json()['id']
+        return True
+
+
+class Journeys:
+    """Сценарии пользователей. Ссылки на объекты берутся из "pool"."""
+
+    def __init__(self, client: Client, random: Random, pool: dict):
+        self.client = client
+        self.random = random
+        self.pool = pool
+
+    def browse(self):
+        """Просмотр ленты, фильтр по тегу и карточки рецептов."""
+        client = self.client
+        client.step(
+            'recipes', 'GET',
+            f'/api/recipes/?page={self.random.randint(1, 5)}'
+        )
+        client.step(
+            'recipes by tag', 'GET',
+            f'/api/recipes/?tags={self.random.choice(self.pool["tags"])}'
+        )
+        for recipe in self.random.sample(self.pool['recipes'], 2):
+            client.step('recipe', 'GET', f'/api/recipes/{recipe}/')
+
+    def search(self):
+        """Автодополнение ингредиентов при создании рецепта."""
+        name = self.random.choice(self.pool['ingredients'])
+        for length in (1, 2, 3):
+            self.client.step(
+                'ingredient search', 'GET',
+                '/api/ingredients/', params={'name': name[:length]}
+            )
+        self.client.step('tags', 'GET', '/api/tags/')
+
+    def favorite(self):
+        """Добавление рецепта в избранное и возврат исходного состояния."""
+        self.toggle('favorite', self.random.choice(self.pool['recipes']))
+
+    def cart(self):
+        """Сборка списка покупок, итоги, выгрузка и очистка."""
+        recipes = self.random.sample(self.pool['recipes'], 3)
+        added = [
+            recipe for recipe in recipes
+            if self.set_state('shopping_cart', recipe, True)
+        ]
+        self.client.step(
+            'cart summary', 'GET', '/api/recipes/shopping_cart_summary/'
+        )
+        self.client.step(
+            'cart download', 'GET', '/api/recipes/download_shopping_cart/'
+        )
+        for recipe in added:
+            self.set_state('shopping_cart', recipe, False, known=True)
+
+    def follow(self):
+        """Подписка на автора, список подписок и отписка."""
+        self.client.step('users', 'GET', '/api/users/')
+        author = self.random.choice([
+            author for author in self.pool['authors']
+            if author != self.client.user_id
+        ])
+        self.toggle('subscribe', author)
+        self.client.step(
+            'subscriptions', 'GET', '/api/users/subscriptions/'
+        )
+
+    def toggle(self, action: str, obj_id: int):
+        """Меняет состояние связи и возвращает исходное."""
+        state = self.get_state(action, obj_id)
+        if state is None:
+            return
+        if self.set_state(action, obj_id, not state, known=state):
+            self.set_state(action, obj_id, state, known=not state)
+
+    def get_state(self, action: str, obj_id: int):
+        """Текущее состояние связи по данным объекта."""
+        resource, field = TOGGLES[action]
+        response = self.client.step(
+            resource.rstrip('s'), 'GET', f'/api/{resource}/{obj_id}/'
+        )
+        if response is None or response.status_code != 200:
+            return None
+        return response.json()[field]
+
+    def set_state(self, action: str, obj_id: int, state: bool,
+                  known=None) -> bool:
+        """
+        Добавляет (state=True) или удаляет связь. Если исходное состояние
+        известно, другой ответ кроме 201/204 считается ошибкой.
+        """
+        resource, _ = TOGGLES[action]
+        success = 201 if state else 204
+        expected = (success, ) if known is not None else (success, 400)
+        response = self.client.step(
+            f'{action} {"add" if state else "remove"}',
+            'POST' if state else 'DELETE',
+            f'/api/{resource}/{obj_id}/{action}/',
+            expected=expected,
+        )
+        return response is not None and response.status_code == success
+
+
+JOURNEYS = (
+    ('browse', 6, Journeys.browse),
+    ('search', 2, Journeys.search),
+    ('favorite', 3, Journeys.favorite),
+    ('cart', 2, Journeys.cart),
+    ('follow', 1, Journeys.follow),
+)
+
+
+class Command(BaseCommand):
+    help = ('Replays weighted user journeys against a running server from '
+            'many threads and checks add/remove races')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='http://localhost',
+            help='Server base URL (default: http://localhost)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Concurrent users, one thread each (default: 8)',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Load phase duration, seconds (default: 30)',
+        )
+        parser.add_argument(
+            '--race-rounds', type=int, default=5,
+            help='Rounds of concurrent add/remove races (default: 5)',
+        )
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Username prefix of generated users (default: bench)',
+        )
+        parser.add_argument(
+            '--password', default='bench-password',
+            help='Password of generated users (default: bench-password)',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help='Random seed (default: 1)',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=30,
+            help='Request timeout, seconds (default: 30)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Save the summary to a JSON file',
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Fail on unexpected responses, race anomalies or crashes',
+        )
+
+    def handle(self, *args, **options):
+        stats = LoadStats()
+        clients = []
+        for worker in range(options['workers']):
+            client = Client(options['url'], stats, options['timeout'])
+            email = f'{options["prefix"]}_{worker}@example.com'
+            if not client.login(email, options['password']):
+                raise CommandError(
+                    f'Cannot log in as {email}, run generate_data with '
+                    f'--users {options["workers"]} or more'
+                )
+            clients.append(client)
+        pool = self.get_pool(clients[0])
+
+        before = stats.total()
+        started = monotonic()
+        deadline = started + options['duration']
+        with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+            futures = [
+                executor.submit(
+                    self.run_worker, client,
+                    Random(options['seed'] + worker), pool, deadline
+                )
+                for worker, client in enumerate(clients)
+            ]
+        for worker, future in enumerate(futures):
+            error = future.exception()
+            if error is not None:
+                stats.crashes.append(f'worker {worker}: {error!r}')
+        elapsed = monotonic() - started
+        throughput = (stats.total() - before) / elapsed
+
+        for race in range(options['race_rounds']):
+            self.race(clients, stats, pool, Random(options['seed'] + race))
+
+        summary = self.report(stats, elapsed, throughput)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(summary, file, indent=2)
+        if options['check'] and (
+            summary['errors'] or summary['races'] or summary['crashes']
+        ):
+            raise CommandError(
+                f'{summary["errors"]} unexpected responses, '
+                f'{len(summary["races"])} race anomalies, '
+                f'{len(summary["crashes"])} crashed workers'
+            )
+        self.stdout.write(self.style.SUCCESS('Load test finished'))
+
+    def get_pool(self, client: Client) -> dict:
+        """Идентификаторы объектов для сценариев."""
+        recipes = client.step('recipes', 'GET', '/api/recipes/?limit=50')
+        users = client.step('users', 'GET', '/api/users/?limit=50')
+        tags = client.step('tags', 'GET', '/api/tags/')
+        ingredients = client.step('ingredients', 'GET', '/api/ingredients/')
+        if None in (recipes, users, tags, ingredients):
+            raise CommandError(f'Server {client.base_url} is unavailable')
+        pool = {
+            'recipes': [item['id'] for item in recipes.json()['results']],
+            'authors': [item['id'] for item in users.json()['results']],
+            'tags': [item['slug'] for item in tags.json()],
+            'ingredients': [item['name'] for item in ingredients.json()],
+        }
+        if not all(len(items) >= 3 for items in pool.values()):
+            raise CommandError('Not enough data, run generate_data first')
+        return pool
+
+    def run_worker(self, client: Client, random: Random, pool: dict,
+                   deadline: float):
+        """Выполняет случайные сценарии до окончания фазы нагрузки."""
+        names, weights, journeys = zip(*JOURNEYS)
+        user_journeys = Journeys(client, random, pool)
+        while monotonic() < deadline:
+            index = random.choices(range(len(JOURNEYS)), weights)[0]
+            journeys[index](user_journeys)
+            with client.stats.lock:
+                client.stats.journeys[names[index]] += 1
+
+    def race(self, clients: list, stats: LoadStats, pool: dict,
+             random: Random):
+        """
+        Все потоки одновременно добавляют, а затем удаляют одну и ту же
+        связь одного пользователя. Аномалией считается любой ответ кроме
+        201/204 и 400 или количество успешных ответов, отличное от одного.
+        """
+        action = random.choice(tuple(TOGGLES))
+        owner = clients[0]
+        obj_id = random.choice([
+            author for author in pool['authors'] if author != owner.user_id
+        ] if action == 'subscribe' else pool['recipes'])
+        journeys = Journeys(owner, random, pool)
+        state = journeys.get_state(action, obj_id)
+        if state is None:
+            return
+        resource, _ = TOGGLES[action]
+        path = f'{owner.base_url}/api/{resource}/{obj_id}/{action}/'
+        for method, success in (
+            ('DELETE', 204), ('POST', 201)
+        ) if state else (('POST', 201), ('DELETE', 204)):
+            barrier = Barrier(len(clients))
+
+            def send():
+                barrier.wait()
+                started = perf_counter()
+                try:
+                    status = owner.session.request(
+                        method, path, timeout=owner.timeout
+                    ).status_code
+                except requests.RequestException:
+                    status = 0
+                stats.add(
+                    f'race {action}', perf_counter() - started, status,
+                    status in (success, 400)
+                )
+                return status
+
+            with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+                statuses = Counter(
+                    future.result()
+                    for future in [
+                        executor.submit(send) for _ in clients
+                    ]
+                )
+            if statuses[success] != 1 or set(statuses) - {success, 400}:
+                stats.races.append({
+                    'action': action,
+                    'method': method,
+                    'id': obj_id,
+                    'statuses': dict(statuses),
+                })
+
+    def report(self, stats: LoadStats, elapsed: float,
+               throughput: float) -> dict:
+        """Выводит итоги и возвращает их в виде словаря."""
+        steps = {}
+        self.stdout.write(
+            f'{"step":<22}{"count":>7}{"p50 ms":>9}{"p95 ms":>9}'
+            f'{"p99 ms":>9}{"errors":>8}  statuses'
+        )
+        for label in sorted(stats.times):
+            times = stats.times[label]
+            steps[label] = {
+                'count': len(times),
+                'p50_ms': round(percentile(times, 0.5) * 1000, 1),
+                'p95_ms': round(percentile(times, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(times, 0.99) * 1000, 1),
+                'errors': stats.errors[label],
+                'statuses': dict(stats.statuses[label]),
+            }
+            row = steps[label]
+            self.stdout.write(
+                f'{label:<22}{row["count"]:>7}{row["p50_ms"]:>9}'
+                f'{row["p95_ms"]:>9}{row["p99_ms"]:>9}{row["errors"]:>8}  '
+                f'{row["statuses"]}'
+            )
+        total = sum(len(times) for times in stats.times.values())
+        errors = sum(stats.errors.values())
+        all_times = [time for times in stats.times.values() for time in times]
+        summary = {
+            'requests': total,
+            'duration_s': round(elapsed, 1),
+            'throughput_rps': round(throughput, 1),
+            'p50_ms': round(percentile(all_times, 0.5) * 1000, 1),
+            'p95_ms': round(percentile(all_times, 0.95) * 1000, 1),
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0,
+            'journeys': dict(stats.journeys),
+            'races': stats.races,
+            'crashes': stats.crashes,
+            'steps': steps,
+        }
+        self.stdout.write(
+            f'Requests: {total}, throughput: {summary["throughput_rps"]} '
+            f'req/s, p50: {summary["p50_ms"]} ms, p95: {summary["p95_ms"]} '
+            f'ms, errors: {errors} ({summary["error_rate"]:.2%})'
+        )
+        self.stdout.write(f'Journeys: {summary["journeys"]}')
+        for race in stats.races:
+            self.stdout.write(self.style.WARNING(f'Race anomaly: {race}'))
+        for crash in stats.crashes:
+            self.stdout.write(self.style.ERROR(f'Worker crashed: {crash}'))
+        return summary
@@ -0,0 +1,144 @@
+"""
+Модуль описания middleware учёта SQL-запросов.
+Включается настройкой QUERY_INSTRUMENTATION.
+"""
+import json
+import logging
+import re
+from collections import Counter
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+SHAPE_SUBSTITUTIONS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\?(?:\s*,\s*\?)+'), '?'),
+    (re.compile(r'\s+'), ' '),
+)
+SHAPE_MAX_LENGTH = 300
+
+
+def query_shape(sql: str) -> str:
+    """
+    Приводит текст запроса к "форме": литералы, параметры и списки
+    значений заменяются на "?", пробельные символы схлопываются.
+    """
+    for pattern, replacement in SHAPE_SUBSTITUTIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryStats:
+    """
+    Обёртка выполнения запросов (connection.execute_wrapper): считает
+    запросы, их суммарное время и повторения одинаковых форм.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - started
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, threshold: int) -> list:
+        """Формы запросов, выполненные не менее "threshold" раз."""
+        return [
+            (shape, times) for shape, times in self.shapes.most_common()
+            if times >= threshold
+        ]
+
+
+def get_query_budget(view_func, method: str):
+    """
+    Возвращает имя представления и бюджет запросов из атрибута
+    "query_budget" его класса: число для всех действий или словарь
+    {действие: число}. Для вьюсетов действие определяется по методу
+    запроса, для остальных представлений - сам метод.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', None), None
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    name = f'{view_class.__name__}.{action}'
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return name, budget.get(action)
+    return name, budget
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает SQL-запросы и время их выполнения в рамках запроса, добавляет
+    заголовок Server-Timing и пишет в журнал строку в формате JSON.
+    Предупреждает о превышении бюджета запросов представления и о
+    многократно повторяющихся формах запросов (признак N+1).
+    Запросы, выполняемые при потоковой отдаче ответа, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        request.query_view = request.query_budget = None
+        started = perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        total = perf_counter() - started
+        response['Server-Timing'] = (
+            f'db;dur={stats.duration * 1000:.1f};'
+            f'desc="{stats.count} queries", '
+            f'total;dur={total * 1000:.1f}'
+        )
+        self.report(request, response, stats, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_view, request.query_budget = get_query_budget(
+            view_func, request.method
+        )
+
+    def report(self, request, response, stats: QueryStats, total: float):
+        """Пишет в журнал итоги запроса и предупреждения."""
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': request.query_view,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.duration * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'budget': request.query_budget,
+        }
+        logger.info(json.dumps(record), extra={'query_stats': record})
+        budget = request.query_budget
+        if budget is not None and stats.count > budget:
+            logger.warning(json.dumps(
+                {'event': 'query_budget_exceeded', **record}
+            ), extra={'query_stats': record})
+        for shape, times in stats.repeated(settings.QUERY_REPEAT_THRESHOLD):
+            logger.warning(json.dumps({
+                'event': 'repeated_query',
+                'method': request.method,
+                'path': request.path,
+                'view': request.query_view,
+                'times': times,
+                'shape': shape[:SHAPE_MAX_LENGTH],
+            }), extra={'query_stats': record})
@@ -1,47 +1,223 @@
 """Модуль описания миксинов."""
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
 from rest_framework.response import Response
 from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
-                                   HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED)
+                                   HTTP_200_OK, HTTP_400_BAD_REQUEST,
+                                   HTTP_401_UNAUTHORIZED)
+
+from .paginators import KeysetPagination
+from .serializers import BulkLinksSerializer
+from .utils import add_links, remove_links
 
 
 class AddDelViewMixin:
     """
     Миксин содержит методы добавления/удаления объекта связи типа
     "многие-ко-многим".
+    Связь добавляется/удаляется одним запросом, код ответа определяется
+    количеством затронутых строк, поэтому из одновременных одинаковых
+    запросов успешен ровно один. Счётчики связей объекта обновляются в
+    той же транзакции.
     """
 
     add_serializer = None
+    relations = {
+        'subscribe': 'subscription',
+        'favorite': 'favorites',
+        'shopping_cart': 'in_cart',
+    }
+    counters = {
+        'subscribe': 'followers_count',
+        'favorite': 'favorites_count',
+        'shopping_cart': 'in_carts_count',
+    }
 
     def add_del_obj(self, obj_id, manager):
         """
         Добавляет/удаляет связь через менеджер "модель.имя_поля_связи".
+        Объект загружается и сериализуется только для ответа на успешное
+        добавление.
+        """
+        user = self.request.user
+        if user.is_anonymous:
+            return Response(status=HTTP_401_UNAUTHORIZED)
+        if not str(obj_id).isdecimal():
+            raise Http404
+        obj_id = int(obj_id)
+        relation = getattr(user, self.relations[manager])
+
+        if self.request.method in ('GET', 'POST'):
+            with transaction.atomic():
+                added = add_links(relation, (obj_id, ))
+                if added:
+                    self.update_counter(manager, relation.model, added, 1)
+                    self.on_add_del(manager, added, added=True)
+            if added:
+                serializer = self.add_serializer(
+                    get_object_or_404(self.queryset, id=obj_id),
+                    context={'request': self.request}
+                )
+                return Response(serializer.data, status=HTTP_201_CREATED)
+        else:
+            with transaction.atomic():
+                removed = remove_links(relation, (obj_id, ))
+                if removed:
+                    self.update_counter(manager, relation.model, removed, -1)
+                    self.on_add_del(manager, removed, added=False)
+            if removed:
+                return Response(status=HTTP_204_NO_CONTENT)
+
+        get_object_or_404(self.queryset, id=obj_id)
+        return Response(status=HTTP_400_BAD_REQUEST)
+
+    def bulk_add_del(self, manager):
+        """
+        Добавляет (POST) или удаляет (DELETE) связи с объектами из списка
+        "ids" одним запросом, при удалении с "all": true - все связи.
+        Возвращает результат по каждому id: "added"/"exists" при
+        добавлении, "removed"/"absent" при удалении или "not_found".
         """
         user = self.request.user
         if user.is_anonymous:
             return Response(status=HTTP_401_UNAUTHORIZED)
+        serializer = BulkLinksSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        obj_ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        remove_all = serializer.validated_data['all']
+        adding = self.request.method == 'POST'
+        if adding and remove_all:
+            return Response(
+                {'all': ['Допустимо только при удалении.']},
+                status=HTTP_400_BAD_REQUEST
+            )
+        relation = getattr(user, self.relations[manager])
 
-        MANAGERS = {
-            'subscribe': user.subscription,
-            'favorite': user.favorites,
-            'shopping_cart': user.in_cart,
-        }
+        with transaction.atomic():
+            if adding:
+                changed = add_links(relation, obj_ids)
+            else:
+                changed = remove_links(
+                    relation, None if remove_all else obj_ids
+                )
+            if changed:
+                self.update_counter(
+                    manager, relation.model, changed, 1 if adding else -1
+                )
+                self.on_add_del(manager, changed, added=adding)
 
-        manager = MANAGERS[manager]
+        if remove_all:
+            obj_ids = sorted(changed)
+        missing = set(obj_ids) - changed
+        existing = set(
+            relation.model.objects.filter(
+                pk__in=missing
+            ).values_list('pk', flat=True)
+        ) if missing else set()
+        done, skipped = ('added', 'exists') if adding else (
+            'removed', 'absent'
+        )
+        return Response({'results': [
+            {
+                'id': obj_id,
+                'status': (
+                    done if obj_id in changed
+                    else skipped if obj_id in existing
+                    else 'not_found'
+                ),
+            }
+            for obj_id in obj_ids
+        ]})
 
-        obj = get_object_or_404(self.queryset, id=obj_id)
-        serializer = self.add_serializer(
-            obj,
-            context={'request': self.request}
+    def update_counter(self, manager, model, obj_ids, delta):
+        """Атомарно изменяет счётчики связей объектов на "delta"."""
+        field = self.counters[manager]
+        model.objects.filter(pk__in=obj_ids).update(
+            **{field: F(field) + delta}
         )
-        exists = manager.filter(id=obj_id).exists()
 
-        if not exists and self.request.method in ('GET', 'POST'):
-            manager.add(obj)
-            return Response(serializer.data, status=HTTP_201_CREATED)
+    def on_add_del(self, manager, obj_ids, added):
+        """
+        Вызывается в транзакции добавления/удаления связи. Позволяет
+        поддерживать производные данные в той же транзакции.
+        """
+        pass
 
-        if exists and self.request.method in ('DELETE', ):
-            manager.remove(obj)
-            return Response(status=HTTP_204_NO_CONTENT)
 
-        return Response(status=HTTP_400_BAD_REQUEST)
+class ReferenceCacheMixin:
+    """
+    Миксин для справочных вьюсетов только для чтения.
+    Отдаёт ответы в формате JSON из кеша отрендеренных ответов со строгим
+    ETag и отвечает 304 на совпадающий If-None-Match без обращения к БД и
+    сериализации.
+    """
+
+    reference_cache = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """Возвращает ответ из кеша, при промахе - рендерит и сохраняет."""
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        key = (
+            self.action,
+            tuple(sorted(kwargs.items())),
+            tuple(
+                (param, tuple(values))
+                for param, values in sorted(request.query_params.lists())
+            ),
+        )
+        entry = self.reference_cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != HTTP_200_OK:
+                return response
+            entry = self.reference_cache.set(
+                key,
+                renderer.render(
+                    response.data,
+                    request.accepted_media_type,
+                    self.get_renderer_context()
+                )
+            )
+        etag, content = entry
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            content_type = request.accepted_media_type
+            if renderer.charset:
+                content_type = f'{content_type}; charset={renderer.charset}'
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        return response
+
+
+class KeysetPaginationMixin:
+    """
+    Миксин, включающий курсорную паджинацию по ключу "cursor_ordering"
+    при наличии в запросе параметра "cursor" (пустого для первой страницы).
+    Без параметра используется "pagination_class" вьюсета.
+    """
+
+    cursor_ordering = ('-pub_date', '-id')
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            query_param = KeysetPagination.cursor_query_param
+            if query_param in self.request.query_params:
+                self._paginator = KeysetPagination()
+            else:
+                return super().paginator
+        return self._paginator
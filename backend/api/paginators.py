@@ -1,5 +1,12 @@
 """Модуль описания паджинаторов."""
-from rest_framework.pagination import PageNumberPagination
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
 
 
 class PageLimitPagination(PageNumberPagination):
@@ -8,3 +15,101 @@ class PageLimitPagination(PageNumberPagination):
     для вывода запрошенного количества страниц.
     """
     page_size_query_param = 'limit'
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная паджинация по набору полей (ключу).
+    Курсор хранит значения полей ключа крайнего объекта страницы, следующая
+    страница выбирается условием на ключ без OFFSET и без подсчёта общего
+    количества объектов, поэтому время ответа не зависит от глубины
+    пролистывания. Ключ задаётся атрибутом "cursor_ordering" вьюсета и
+    должен заканчиваться уникальным полем.
+    """
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = getattr(view, 'cursor_ordering', self.ordering)
+        self.model = queryset.model
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            cursor = Cursor(offset=0, reverse=False, position=None)
+        self.cursor = cursor
+        ordering = self.ordering
+        if cursor.reverse:
+            ordering = tuple(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if cursor.position is not None:
+            queryset = queryset.filter(
+                self.after(ordering, self.load_position(cursor.position))
+            )
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if cursor.reverse:
+            self.page.reverse()
+            self.has_next = cursor.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor.position is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0,
+            reverse=False,
+            position=self.dump_position(self.page[-1]),
+        ))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0,
+            reverse=True,
+            position=self.dump_position(self.page[0]),
+        ))
+
+    def dump_position(self, obj) -> str:
+        """Сериализует значения полей ключа объекта."""
+        values = (
+            getattr(obj, field.lstrip('-')) for field in self.ordering
+        )
+        return json.dumps([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in values
+        ])
+
+    def load_position(self, position: str) -> list:
+        """Восстанавливает значения полей ключа из курсора."""
+        try:
+            values = json.loads(position)
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def after(ordering: tuple, position: list) -> Q:
+        """Условие "ключ строго после позиции" в заданном порядке."""
+        condition, equal = Q(), Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
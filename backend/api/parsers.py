@@ -0,0 +1,37 @@
+"""Модуль описания парсеров тела запроса."""
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.status import HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+class RequestTooLarge(APIException):
+    status_code = HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Тело запроса слишком большое.'
+    default_code = 'request_too_large'
+
+
+class SizeLimitMixin:
+    """
+    Миксин парсера, отклоняющий запрос по заголовку Content-Length до
+    чтения тела.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        if request is not None:
+            try:
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > settings.RECIPE_REQUEST_MAX_SIZE:
+                raise RequestTooLarge
+        return super().parse(stream, media_type, parser_context)
+
+
+class SizeLimitedJSONParser(SizeLimitMixin, JSONParser):
+    """JSON-парсер с ограничением размера тела запроса."""
+
+
+class SizeLimitedMultiPartParser(SizeLimitMixin, MultiPartParser):
+    """Multipart-парсер с ограничением размера тела запроса."""
@@ -0,0 +1,192 @@
+"""Модуль описания рендереров."""
+import csv
+import json
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework.renderers import BaseRenderer
+
+SHOPPING_LIST_TITLE = 'Список покупок пользователя: {}'
+SHOPPING_LIST_HEADER = ('Ингредиент', 'Количество', 'Единицы измерения')
+SHOPPING_LIST_FOOTER = 'Сформировано в продуктовом помощнике Foodgram'
+
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FALLBACK_FONT_NAME = 'Helvetica'
+PDF_FONT_SIZE = 11
+PDF_LINE_HEIGHT = 6 * mm
+PDF_MARGIN = 20 * mm
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+    Метод "stream" возвращает генератор частей файла для
+    StreamingHttpResponse, метод "render" используется только для ответов
+    с ошибками.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode('utf-8')
+
+    def stream(self, user, created: str, ingredients):
+        """
+        Возвращает генератор частей файла. "ingredients" - итератор
+        словарей с ключами "name", "sum_amount" и "measure".
+        """
+        raise NotImplementedError
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """Список покупок в формате *.csv."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, user, created, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow((SHOPPING_LIST_TITLE.format(user.first_name), ))
+        yield writer.writerow((created, ))
+        yield writer.writerow(('', ))
+        yield writer.writerow(SHOPPING_LIST_HEADER)
+        for ingredient in ingredients:
+            yield writer.writerow(
+                (
+                    ingredient['name'],
+                    ingredient['sum_amount'],
+                    ingredient['measure']
+                )
+            )
+        yield writer.writerow(('', ))
+        yield writer.writerow((SHOPPING_LIST_FOOTER, ))
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """Список покупок в виде простого текста."""
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, user, created, ingredients):
+        yield f'{SHOPPING_LIST_TITLE.format(user.first_name)}\n'
+        yield f'{created}\n\n'
+        for ingredient in ingredients:
+            yield (
+                f'- {ingredient["name"]} '
+                f'({ingredient["measure"]}) - {ingredient["sum_amount"]}\n'
+            )
+        yield f'\n{SHOPPING_LIST_FOOTER}\n'
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """Список покупок в формате JSON."""
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def stream(self, user, created, ingredients):
+        yield (
+            f'{{"user": {json.dumps(user.first_name, ensure_ascii=False)}, '
+            f'"created": {json.dumps(created)}, "ingredients": ['
+        )
+        separator = ''
+        for ingredient in ingredients:
+            yield separator + json.dumps(
+                {
+                    'name': ingredient['name'],
+                    'measurement_unit': ingredient['measure'],
+                    'amount': ingredient['sum_amount'],
+                },
+                ensure_ascii=False
+            )
+            separator = ', '
+        yield ']}'
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """
+    Список покупок в формате *.pdf с разбивкой на страницы формата A4.
+    Для кириллицы используется шрифт из настройки SHOPPING_LIST_PDF_FONT.
+    Документ собирается целиком, так как PDF завершается таблицей
+    ссылок на объекты, и отдаётся частями.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    @staticmethod
+    def get_font_name() -> str:
+        """Регистрирует шрифт при первом обращении."""
+        if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+            return PDF_FONT_NAME
+        try:
+            pdfmetrics.registerFont(
+                TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+            )
+        except (OSError, TTFError):
+            return PDF_FALLBACK_FONT_NAME
+        return PDF_FONT_NAME
+
+    def stream(self, user, created, ingredients):
+        buffer = BytesIO()
+        canvas = Canvas(buffer, pagesize=A4)
+        font_name = self.get_font_name()
+        width, height = A4
+        lines = [
+            SHOPPING_LIST_TITLE.format(user.first_name),
+            created,
+            '',
+        ]
+        lines.extend(
+            f'{ingredient["name"]} ({ingredient["measure"]}) - '
+            f'{ingredient["sum_amount"]}'
+            for ingredient in ingredients
+        )
+        lines.extend(('', SHOPPING_LIST_FOOTER))
+        lines_per_page = int((height - 2 * PDF_MARGIN) // PDF_LINE_HEIGHT)
+        for start in range(0, len(lines), lines_per_page):
+            canvas.setFont(font_name, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+            for line in lines[start:start + lines_per_page]:
+                canvas.drawString(PDF_MARGIN, y, line)
+                y -= PDF_LINE_HEIGHT
+            canvas.drawRightString(
+                width - PDF_MARGIN,
+                PDF_MARGIN / 2,
+                str(canvas.getPageNumber())
+            )
+            canvas.showPage()
+        canvas.save()
+        buffer.seek(0)
+        while True:
+            chunk = buffer.read(PDF_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListCSVRenderer,
+    ShoppingListTextRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListPDFRenderer,
+)
@@ -3,19 +3,58 @@ from re import match
 from typing import Any
 
 from django.contrib.auth import get_user_model
-from django.core.paginator import Paginator
+from django.core.files.storage import default_storage
 from django.db.models import F
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
-from recipe.models import Ingredient, Recipe, Tag
-from rest_framework.serializers import (ModelSerializer, SerializerMethodField,
+from recipe.models import Ingredient, Recipe, ShoppingCartTotal, Tag
+from recipe.renditions import RENDITIONS
+from rest_framework.serializers import (BooleanField, Field, IntegerField,
+                                        ListField, ModelSerializer,
+                                        ReadOnlyField, Serializer,
+                                        SerializerMethodField,
                                         ValidationError)
 
-from .utils import recipe_amount_ingredients_set
-from .validators import class_obj_validate, hex_color_validate
+from .fields import RecipeImageField
+from .utils import (get_recipes_limit, get_subscribed_ids, recipe_create,
+                    recipe_update)
+from .validators import (class_obj_validate, hex_color_validate,
+                         objs_exist_validate)
 
 User = get_user_model()
 
+BULK_LINKS_LIMIT = 100
+
+
+class ImageRenditionsField(Field):
+    """
+    Поле ссылок на уменьшенные копии изображения рецепта по размерам и
+    форматам. Пока копии не построены, возвращает "None".
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value: dict) -> Any:
+        if not all(name in value for name in RENDITIONS):
+            return None
+        request = self.context.get('request')
+        urls = {
+            name: {
+                extension: default_storage.url(path)
+                for extension, path in value[name].items()
+            }
+            for name in RENDITIONS
+        }
+        if request is None:
+            return urls
+        return {
+            name: {
+                extension: request.build_absolute_uri(url)
+                for extension, url in formats.items()
+            }
+            for name, formats in urls.items()
+        }
+
 
 class UserSerializer(ModelSerializer):
     """
@@ -39,18 +78,28 @@ class UserSerializer(ModelSerializer):
         read_only_fields = ('is_subscribed', )
 
     def get_is_subscribed(self, obj: object) -> bool:
-        """Проверка подписки текущего пользователя на просматриваемого."""
-        user = self.context.get('request').user
+        """
+        Проверка подписки текущего пользователя на просматриваемого.
+        Использует аннотацию "is_subscribed", если она есть, иначе общее для
+        запроса множество id авторов из подписок пользователя.
+        """
+        request = self.context.get('request')
+        user = request.user
         if user.is_anonymous or (user == obj):
             return False
-        return user.subscription.filter(id=obj.id).exists()
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
+        return obj.id in get_subscribed_ids(request)
 
 
 class RecipeSmallSerializer(ModelSerializer):
     """Сериализатор для модели Recipe с сокращённым списком полей."""
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
         read_only_fields = ('__all__', )
 
 
@@ -60,7 +109,6 @@ class UserFollowsSerializer(UserSerializer):
     """
     # recipes = RecipeSmallSerializer(many=True, read_only=True)
     recipes = SerializerMethodField(method_name='paginated_recipes')
-    recipes_count = SerializerMethodField(method_name='get_recipes_count')
 
     class Meta:
         model = User
@@ -76,10 +124,6 @@ class UserFollowsSerializer(UserSerializer):
         )
         read_only_fields = ('__all__', )
 
-    def get_recipes_count(self, obj: object) -> int:
-        """Показывает суммарное количество рецептов у каждого автора."""
-        return obj.recipes.count()
-
     def get_is_subscribed(*args) -> bool:
         """
         Проверка подписки текущего пользователя на просматриваемого.
@@ -89,11 +133,15 @@ class UserFollowsSerializer(UserSerializer):
         return True
 
     def paginated_recipes(self, obj):
-        paginator = Paginator(
-            obj.recipes.all(),
-            self.context.get('request').query_params.get('recipes_limit', 3)
-        )
-        recipes = paginator.page(1)
+        """
+        Последние рецепты автора в количестве "recipes_limit".
+        Использует подгруженный атрибут "limited_recipes", если он есть.
+        """
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[
+                :get_recipes_limit(self.context.get('request'))
+            ]
         serializer = RecipeSmallSerializer(recipes, many=True)
         return serializer.data
 
@@ -145,6 +193,21 @@ class IngredientSerializer(ModelSerializer):
         read_only_fields = ('__all__', )
 
 
+class ShoppingCartTotalSerializer(ModelSerializer):
+    """
+    Сериализатор для модели ShoppingCartTotal: ингредиент и его суммарное
+    количество в списке покупок.
+    """
+    id = IntegerField(source='ingredient.id', read_only=True)
+    name = ReadOnlyField(source='ingredient.name')
+    measurement_unit = ReadOnlyField(source='ingredient.measurement_unit')
+    amount = IntegerField(source='total_amount', read_only=True)
+
+    class Meta:
+        model = ShoppingCartTotal
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class TagSerializer(ModelSerializer):
     """Сериализатор для модели Tag."""
     class Meta:
@@ -159,6 +222,34 @@ class TagSerializer(ModelSerializer):
         return f'#{color}'
 
 
+class RecipeImageSerializer(ModelSerializer):
+    """Сериализатор для замены изображения рецепта."""
+    image = RecipeImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ('image', )
+
+
+class BulkLinksSerializer(Serializer):
+    """
+    Сериализатор запроса массового добавления/удаления связей: список id
+    объектов "ids" или признак "all" для удаления всех связей.
+    """
+    ids = ListField(
+        child=IntegerField(min_value=1),
+        max_length=BULK_LINKS_LIMIT,
+        default=list,
+    )
+    all = BooleanField(default=False)
+
+    def validate(self, data):
+        """Должен быть передан ровно один из параметров."""
+        if data['all'] == bool(data['ids']):
+            raise ValidationError('Передайте непустой "ids" или "all".')
+        return data
+
+
 class RecipeSerializer(ModelSerializer):
     """Сериализатор для модели Recipe."""
     tags = TagSerializer(many=True, read_only=True)
@@ -168,7 +259,8 @@ class RecipeSerializer(ModelSerializer):
     is_in_shopping_cart = SerializerMethodField(
         method_name='get_is_in_shopping_cart'
     )
-    image = Base64ImageField()
+    image = RecipeImageField()
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
@@ -179,6 +271,7 @@ class RecipeSerializer(ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time',
             'is_favorited',
@@ -190,20 +283,37 @@ class RecipeSerializer(ModelSerializer):
         )
 
     def get_ingredients(self, obj: object) -> Any:
-        """Возвращает список ингридиентов для рецепта."""
-        ingredients = obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('recipe__amount')
-        )
-        return ingredients
+        """
+        Возвращает список ингридиентов для рецепта.
+        Использует подгруженные через prefetch_related объекты
+        IngredientAmount, если они есть.
+        """
+        if 'ingredient' not in getattr(obj, '_prefetched_objects_cache', {}):
+            return obj.ingredients.values(
+                'id',
+                'name',
+                'measurement_unit',
+                amount=F('recipe__amount')
+            )
+        return [
+            {
+                'id': item.ingredients.id,
+                'name': item.ingredients.name,
+                'measurement_unit': item.ingredients.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in obj.ingredient.all()
+        ]
 
     def get_is_favorited(self, obj: object) -> bool:
         """
         Возвращает "True" если переданный рецепт находится в избранном у
         текущего пользователя.
+        Использует аннотацию "is_favorited", если она есть.
         """
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
         user = self.context.get('request').user
         return (user.is_authenticated
                 and user.favorites.filter(id=obj.id).exists())
@@ -212,7 +322,11 @@ class RecipeSerializer(ModelSerializer):
         """
         Возвращает "True" если переданный рецепт находится в списке покупок у
         текущего пользователя.
+        Использует аннотацию "is_in_shopping_cart", если она есть.
         """
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         user = self.context.get('request').user
         return (user.is_authenticated
                 and user.in_cart.filter(id=obj.id).exists())
@@ -232,57 +346,34 @@ class RecipeSerializer(ModelSerializer):
                     f'data: {data}'
                 )
 
-        for tag in tags:
-            class_obj_validate(
-                value=tag,
-                klass=Tag
-            )
+        objs_exist_validate(values=tags, klass=Tag)
 
-        valid_ingredients = []
-        valid_amounts = []
+        ingredient_ids = [item.get('id') for item in ingredients]
+        valid_ingredients = objs_exist_validate(
+            values=ingredient_ids,
+            klass=Ingredient
+        )
+        if len(valid_ingredients) != len(ingredient_ids):
+            raise ValidationError('Ингредиенты не должны повторяться')
         for item in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=item['id'])
-            if ingredient in valid_ingredients:
-                raise ValidationError('Ингредиенты не должны повторяться')
-            valid_ingredients.append(ingredient)
-            class_obj_validate(value=item['amount'])
-            valid_amounts.append(item['amount'])
+            class_obj_validate(value=item.get('amount'))
         valid_ingredients = [
-            dict(ingredient=i, amount=a) for i, a in zip(
-                valid_ingredients, valid_amounts
-            )
+            dict(
+                ingredient=valid_ingredients[int(item['id'])],
+                amount=item['amount']
+            ) for item in ingredients
         ]
 
+        data['tags'] = list({int(tag) for tag in tags})
         data['name'] = name.lower()
-        data['tags'] = tags
         data['ingredients'] = valid_ingredients
         data['author'] = self.context.get('request').user
         return data
 
     def create(self, validated_data):
         """Создаёт новый объект модели Recipe."""
-        image = validated_data.pop('image')
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(image=image, **validated_data)
-        recipe.tags.set(tags)
-        recipe_amount_ingredients_set(recipe, ingredients)
-        return recipe
+        return recipe_create(**validated_data)
 
     def update(self, recipe, validated_data):
         """Обновляет объект Recipe."""
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-
-        super().update(recipe, validated_data)
-
-        if tags:
-            recipe.tags.clear()
-            recipe.tags.set(tags)
-
-        if ingredients:
-            recipe.ingredients.clear()
-            recipe_amount_ingredients_set(recipe, ingredients)
-
-        recipe.save()
-        return recipe
+        return recipe_update(recipe, **validated_data)
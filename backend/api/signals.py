@@ -0,0 +1,152 @@
+"""Модуль описания обработчиков сигналов."""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipe.models import Ingredient, Recipe, ShoppingCartTotal, Tag
+from recipe.renditions import (delete_renditions, needs_renditions,
+                               schedule_renditions)
+
+from .caches import ingredient_cache, tag_cache, token_cache
+from .indexes import ingredient_index, tag_index
+
+User = get_user_model()
+
+# Поля автора, выводимые в ответах с рецептами.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs) -> None:
+    """Сбрасывает индекс и кеш ответов ингредиентов при изменении таблицы."""
+    ingredient_index.invalidate()
+    ingredient_cache.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_cache(**kwargs) -> None:
+    """Сбрасывает индекс и кеш ответов тегов при изменении таблицы."""
+    tag_index.invalidate()
+    tag_cache.invalidate()
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def touch_recipes_with_ingredient(instance, **kwargs) -> None:
+    """Обновляет дату изменения рецептов с изменённым ингредиентом."""
+    Recipe.objects.filter(ingredients=instance).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def touch_recipes_with_tag(instance, **kwargs) -> None:
+    """Обновляет дату изменения рецептов с изменённым тегом."""
+    Recipe.objects.filter(tags=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=User)
+def touch_recipes_of_changed_author(instance, update_fields, **kwargs) -> None:
+    """
+    Обновляет дату изменения рецептов автора при изменении его данных,
+    выводимых в ответах с рецептами, чтобы сменились их ETag.
+    """
+    if instance.pk is None or (
+        update_fields is not None and not set(update_fields) & set(
+            AUTHOR_FIELDS
+        )
+    ):
+        return
+    previous = User.objects.filter(pk=instance.pk).values(
+        *AUTHOR_FIELDS
+    ).first()
+    if previous is None or all(
+        previous[field] == getattr(instance, field) for field in AUTHOR_FIELDS
+    ):
+        return
+    Recipe.objects.filter(author=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(instance, **kwargs) -> None:
+    """Обновляет поисковый вектор рецепта после сохранения."""
+    Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_image_renditions(instance, **kwargs) -> None:
+    """Ставит в очередь построение копий нового изображения рецепта."""
+    if needs_renditions(instance):
+        schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image_renditions(instance, **kwargs) -> None:
+    """Удаляет копии изображения удалённого рецепта."""
+    renditions = instance.image_renditions
+    transaction.on_commit(lambda: delete_renditions(renditions))
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_cart_totals(instance, **kwargs) -> None:
+    """Вычитает удаляемый рецепт из итогов списков покупок."""
+    ShoppingCartTotal.objects.apply_recipe(
+        Recipe.shopping_cart.through.objects.filter(
+            recipe=instance
+        ).values_list('foodgramuser_id', flat=True),
+        instance.id,
+        -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_author_recipes_count(instance, created, **kwargs) -> None:
+    """Увеличивает счётчик рецептов автора при создании рецепта."""
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_author_recipes_count(instance, **kwargs) -> None:
+    """Уменьшает счётчик рецептов автора при удалении рецепта."""
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=F('recipes_count') - 1
+    )
+
+
+@receiver(pre_delete, sender=User)
+def decrement_counters_of_user_links(instance, **kwargs) -> None:
+    """
+    Уменьшает счётчики рецептов и авторов, связи с которыми удаляются
+    вместе с пользователем.
+    """
+    Recipe.objects.filter(favorite=instance).update(
+        favorites_count=F('favorites_count') - 1
+    )
+    Recipe.objects.filter(shopping_cart=instance).update(
+        in_carts_count=F('in_carts_count') - 1
+    )
+    User.objects.filter(followers=instance).update(
+        followers_count=F('followers_count') - 1
+    )
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(instance, **kwargs) -> None:
+    """Сбрасывает кеш удалённого токена (выход пользователя)."""
+    token_cache.invalidate(instance.key)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_cached_user_tokens(instance, **kwargs) -> None:
+    """
+    Сбрасывает кеш токенов пользователя при его изменении (смена пароля,
+    деактивация, правка профиля) и удалении.
+    """
+    token_cache.invalidate_user(instance.pk)
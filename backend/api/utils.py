@@ -1,50 +1,295 @@
 """Модуль описания вспомогательных функций."""
-import csv
+from calendar import timegm
 from datetime import datetime as dt
+from hashlib import md5
 
-from django.http.response import HttpResponse
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F
+from django.http.response import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 
-from recipe.models import IngredientAmount
+from recipe.models import IngredientAmount, Recipe, ShoppingCartTotal
+
+User = get_user_model()
+
+RECIPES_LIMIT_DEFAULT = 3
+
+
+def get_recipes_limit(request) -> int:
+    """
+    Возвращает количество рецептов автора для вывода в подписках из
+    параметра "recipes_limit". При некорректном значении используется
+    значение по умолчанию.
+    """
+    recipes_limit = request.query_params.get('recipes_limit', '')
+    if recipes_limit.isdecimal() and int(recipes_limit) > 0:
+        return int(recipes_limit)
+    return RECIPES_LIMIT_DEFAULT
+
+
+def get_search_limit(request) -> int:
+    """
+    Возвращает количество ингредиентов для вывода в автодополнении из
+    параметра "limit", но не более INGREDIENT_SEARCH_LIMIT.
+    """
+    limit = request.query_params.get('limit', '')
+    if limit.isdecimal() and int(limit) > 0:
+        return min(int(limit), settings.INGREDIENT_SEARCH_LIMIT)
+    return settings.INGREDIENT_SEARCH_LIMIT
+
+
+def get_subscribed_ids(request) -> set:
+    """
+    Возвращает множество id авторов, на которых подписан текущий
+    пользователь.
+    Множество загружается одним запросом и кешируется в объекте запроса,
+    поэтому все сериализаторы в рамках запроса используют общий результат.
+    """
+    subscribed_ids = getattr(request, '_subscribed_ids', None)
+    if subscribed_ids is None:
+        user = request.user
+        if user.is_anonymous:
+            subscribed_ids = set()
+        else:
+            subscribed_ids = set(
+                User.subscription.through.objects.filter(
+                    from_foodgramuser=user
+                ).values_list('to_foodgramuser_id', flat=True)
+            )
+        request._subscribed_ids = subscribed_ids
+    return subscribed_ids
+
+
+def add_links(relation, obj_ids) -> set:
+    """
+    Добавляет связи "многие-ко-многим" менеджера "relation" с объектами
+    "obj_ids" одним запросом INSERT ... SELECT, пропускающим существующие
+    связи и несуществующие объекты. Возвращает множество id объектов, связи
+    с которыми добавлены.
+    """
+    through = relation.through._meta
+    target = relation.model._meta
+    quote = connection.ops.quote_name
+    obj_ids = sorted(set(obj_ids))
+    pk = quote(target.pk.column)
+    target_column = quote(
+        through.get_field(relation.target_field_name).column
+    )
+    sql = (
+        f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+        f'{quote(through.db_table)} ('
+        f'{quote(through.get_field(relation.source_field_name).column)}, '
+        f'{target_column}) '
+        f'SELECT %s, {pk} FROM {quote(target.db_table)} '
+        f'WHERE {pk} IN ({", ".join(["%s"] * len(obj_ids))}) '
+        f'ORDER BY {pk} '
+        f'{connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+        f' RETURNING {target_column}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (relation.instance.pk, *obj_ids))
+        return {row[0] for row in cursor.fetchall()}
+
+
+def remove_links(relation, obj_ids=None) -> set:
+    """
+    Удаляет связи "многие-ко-многим" менеджера "relation" с объектами
+    "obj_ids" (все связи, если "obj_ids" не переданы) одним запросом
+    DELETE. Возвращает множество id объектов, связи с которыми удалены.
+    """
+    through = relation.through._meta
+    quote = connection.ops.quote_name
+    source_column = quote(
+        through.get_field(relation.source_field_name).column
+    )
+    target_column = quote(
+        through.get_field(relation.target_field_name).column
+    )
+    sql = (
+        f'DELETE FROM {quote(through.db_table)} '
+        f'WHERE {source_column} = %s'
+    )
+    params = [relation.instance.pk]
+    if obj_ids is not None:
+        obj_ids = sorted(set(obj_ids))
+        sql += f' AND {target_column} IN ({", ".join(["%s"] * len(obj_ids))})'
+        params += obj_ids
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING {target_column}', params)
+        return {row[0] for row in cursor.fetchall()}
 
 
 def recipe_amount_ingredients_set(recipe, ingredients):
     """
-    Создаёт объект IngredientAmount связывающий объекты Recipe и
+    Создаёт объекты IngredientAmount связывающие объекты Recipe и
     Ingredient с указанием количества ("amount") конкретного ингридиента.
+    Все объекты создаются одним запросом.
     """
-    for ingredient in ingredients:
-        IngredientAmount.objects.get_or_create(
+    if not ingredients:
+        return
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(
             recipe=recipe,
             ingredients=ingredient['ingredient'],
             amount=ingredient['amount'],
         )
+        for ingredient in ingredients
+    )
 
 
-def prepare_file(user, ingredients, filename='shopping_list.csv'):
+def recipe_create(tags, ingredients, **fields) -> Recipe:
     """
-    Формирует объект типа HttpResponse, содержащий файл формата *.csv со
+    Создаёт рецепт вместе с тегами и ингредиентами в одной транзакции.
+    Ожидает проверенные данные: "tags" - список id тегов, "ingredients" -
+    список словарей с ключами "ingredient" и "amount".
+    Используется как API, так и инструментами массовой загрузки.
+    """
+    with transaction.atomic():
+        recipe = Recipe.objects.create(**fields)
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag_id=tag) for tag in tags
+        )
+        recipe_amount_ingredients_set(recipe, ingredients)
+    return recipe
+
+
+def recipe_tags_update(recipe, tags):
+    """
+    Приводит теги рецепта к переданному списку id: удаляет лишние и
+    добавляет недостающие связи, не трогая совпадающие.
+    """
+    through = Recipe.tags.through
+    current = set(
+        through.objects.filter(recipe=recipe).values_list('tag_id', flat=True)
+    )
+    tags = set(tags)
+    if current - tags:
+        through.objects.filter(
+            recipe=recipe, tag_id__in=current - tags
+        ).delete()
+    if tags - current:
+        through.objects.bulk_create(
+            through(recipe=recipe, tag_id=tag) for tag in tags - current
+        )
+
+
+def recipe_ingredients_update(recipe, ingredients):
+    """
+    Приводит ингредиенты рецепта к переданному списку: удаляет лишние,
+    создаёт новые и обновляет изменившиеся количества.
+    Изменения переносятся в итоги списков покупок, содержащих рецепт.
+    """
+    current = {
+        amount.ingredients_id: amount
+        for amount in IngredientAmount.objects.filter(recipe=recipe)
+    }
+    new = {
+        ingredient['ingredient'].id: ingredient for ingredient in ingredients
+    }
+    deltas = {
+        key: int(new[key]['amount']) if key in new else 0
+        for key in new.keys() | current.keys()
+    }
+    for key, amount in current.items():
+        deltas[key] -= amount.amount
+    removed = current.keys() - new.keys()
+    if removed:
+        IngredientAmount.objects.filter(
+            recipe=recipe, ingredients_id__in=removed
+        ).delete()
+    recipe_amount_ingredients_set(
+        recipe,
+        [new[key] for key in new.keys() - current.keys()]
+    )
+    changed = []
+    for key in new.keys() & current.keys():
+        amount = current[key]
+        if amount.amount != int(new[key]['amount']):
+            amount.amount = new[key]['amount']
+            changed.append(amount)
+    if changed:
+        IngredientAmount.objects.bulk_update(changed, ('amount', ))
+    if any(deltas.values()):
+        ShoppingCartTotal.objects.apply_delta(
+            Recipe.shopping_cart.through.objects.filter(
+                recipe=recipe
+            ).values_list('foodgramuser_id', flat=True),
+            deltas
+        )
+
+
+def recipe_update(recipe, tags, ingredients, **fields) -> Recipe:
+    """
+    Обновляет рецепт в одной транзакции. Теги и ингредиенты обновляются
+    по разнице с текущими значениями, поэтому при неизменном составе
+    запросов на запись в связующие таблицы не выполняется.
+    """
+    with transaction.atomic():
+        for attr, value in fields.items():
+            setattr(recipe, attr, value)
+        recipe.save()
+        if tags:
+            recipe_tags_update(recipe, tags)
+        if ingredients:
+            recipe_ingredients_update(recipe, ingredients)
+    return recipe
+
+
+def shopping_list_ingredients(user):
+    """
+    Выборка ингредиентов из рецептов в списке покупок пользователя с
+    суммарным количеством каждого ингредиента.
+    Читает поддерживаемые итоги ShoppingCartTotal.
+    """
+    return user.cart_totals.values(
+        name=F('ingredient__name'),
+        measure=F('ingredient__measurement_unit'),
+        sum_amount=F('total_amount')
+    ).order_by(
+        'name'
+    )
+
+
+def stream_shopping_list(user, ingredients, renderer):
+    """
+    Формирует объект типа StreamingHttpResponse, содержащий файл со
     списком и количеством ингредиентов, которые нужно купить.
+    Формат файла определяется переданным рендерером.
     """
-    filename = 'shopping_list.csv'
     create_time = dt.now().strftime('%d.%m.%Y %H:%M')
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
+    response = StreamingHttpResponse(
+        renderer.stream(user, create_time, ingredients),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename=shopping_list.{renderer.format}'
+    )
+    return response
 
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename={filename}'
-
-    writer = csv.writer(response)
-    writer.writerow([f'Список покупок пользователя: {user.first_name}', ])
-    writer.writerow([f'{create_time}', ])
-    writer.writerow(['', ])
-    writer.writerow(['Ингредиент', 'Количество', 'Единицы измерения'])
-    for ingredient in ingredients:
-        writer.writerow(
-            [
-                ingredient['ingredient'],
-                ingredient['sum_amount'],
-                ingredient['measure']
-            ]
-        )
-    writer.writerow(['', ])
-    writer.writerow(['Сформировано в продуктовом помощнике Foodgram', ])
 
+def conditional_response(request, versions: list, handler,
+                         last_modified: dt = None):
+    """
+    Отвечает 304 на условный запрос, если ответ не изменился, иначе
+    формирует ответ обработчиком "handler". ETag вычисляется по лёгкой
+    выборке версий объектов ответа, а не по его содержимому.
+    """
+    etag = f'"{md5(repr(versions).encode()).hexdigest()}"'
+    if last_modified is not None:
+        last_modified = timegm(last_modified.utctimetuple())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = handler()
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Authorization',))
     return response
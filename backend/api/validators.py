@@ -25,6 +25,24 @@ def class_obj_validate(value: str, klass: object = None) -> object:
     return None
 
 
+def objs_exist_validate(values: list, klass: object) -> dict:
+    """
+    Проверка существования объектов модели с переданными id.
+    Все объекты загружаются одним запросом, возвращается словарь
+    {id: объект}.
+    """
+    for value in values:
+        class_obj_validate(value=value)
+    ids = {int(value) for value in values}
+    objs = klass.objects.in_bulk(ids)
+    missing = sorted(ids - objs.keys())
+    if missing:
+        raise ValidationError(
+            f'Объектов {klass.__name__} с ID={missing} не существует.'
+        )
+    return objs
+
+
 def hex_color_validate(value: str) -> None:
     """
     Проверка соответствия переданного числа шестнадцатиричному формату цвета.
@@ -1,46 +1,86 @@
 """Модуль описания вьюсетов."""
+from itertools import chain
+
 from django.contrib.auth import get_user_model
-from django.db.models import F, Sum
+from django.db.models import Prefetch
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from .filters import IngredientFilter, RecipeFilter
-from .mixins import AddDelViewMixin
-from .paginators import PageLimitPagination
+from .caches import ingredient_cache, tag_cache, token_cache
+from .filters import POPULAR_ORDERING, RecipeFilter
+from .indexes import ingredient_index
+from .mixins import (AddDelViewMixin, KeysetPaginationMixin,
+                     ReferenceCacheMixin)
+from .paginators import KeysetPagination, PageLimitPagination
+from .parsers import SizeLimitedJSONParser, SizeLimitedMultiPartParser
+from .renderers import SHOPPING_LIST_RENDERERS
 from .permissions import AdminOrReadOnly, AuthorAdminOrReadOnly
-from recipe.models import Ingredient, IngredientAmount, Recipe, Tag
-from .serializers import (IngredientSerializer, RecipeSerializer,
-                          RecipeSmallSerializer, TagSerializer,
+from recipe.models import Ingredient, Recipe, ShoppingCartTotal, Tag
+from .serializers import (IngredientSerializer, RecipeImageSerializer,
+                          RecipeSerializer, RecipeSmallSerializer,
+                          ShoppingCartTotalSerializer, TagSerializer,
                           UserFollowsSerializer)
-from .utils import prepare_file
+from .utils import (conditional_response, get_recipes_limit,
+                    get_search_limit, shopping_list_ingredients,
+                    stream_shopping_list)
 
 User = get_user_model()
 
 
-class UserViewSet(DjoserUserViewSet, AddDelViewMixin):
+class UserViewSet(KeysetPaginationMixin, DjoserUserViewSet, AddDelViewMixin):
     """
     ViewSet для работы с пользователми.
     Авторизованные пользователи имеют возможность подписаться на автора
     рецепта.
     """
     pagination_class = PageLimitPagination
+    cursor_ordering = ('username', 'id')
     add_serializer = UserFollowsSerializer
+    query_budget = {
+        'list': 4,
+        'retrieve': 3,
+        'me': 2,
+        'create': 5,
+        'subscriptions': 4,
+        'subscribe': 7,
+        'subscribe_bulk': 5,
+    }
 
     @action(methods=('GET', 'POST', 'DELETE'), detail=True)
     def subscribe(self, request, id):
         """Создаёт/удалет подписку текущего пользователя на автора рецепта."""
         return self.add_del_obj(id, 'subscribe')
 
+    @action(
+        methods=('POST', 'DELETE'),
+        detail=False,
+        url_path='subscribe',
+        url_name='subscribe-bulk'
+    )
+    def subscribe_bulk(self, request):
+        """Создаёт/удаляет подписки текущего пользователя на авторов."""
+        return self.bulk_add_del('subscribe')
+
     @action(methods=('GET', ), detail=False)
     def subscriptions(self, request):
         """Список подписок текущего пользоваетеля."""
         user = self.request.user
         if not user.is_authenticated:
             return Response(status=HTTP_401_UNAUTHORIZED)
-        authors = User.objects.filter(followers=user)
+        authors = User.objects.filter(followers=user).prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=Recipe.objects.latest_per_author(
+                    get_recipes_limit(request)
+                ),
+                to_attr='limited_recipes'
+            )
+        )
         pages = self.paginate_queryset(authors)
         serializer = UserFollowsSerializer(
             pages,
@@ -50,31 +90,154 @@ class UserViewSet(DjoserUserViewSet, AddDelViewMixin):
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
-    """Вьюсет для работы с тэгами."""
+class TagViewSet(ReferenceCacheMixin, ReadOnlyModelViewSet):
+    """Вьюсет для работы с тэгами. Ответы кешируются."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AdminOrReadOnly, )
     pagination_class = None
+    reference_cache = tag_cache
+    query_budget = 1
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
-    """Вьюсет для работы с ингредиентами."""
+class IngredientViewSet(ReferenceCacheMixin, ReadOnlyModelViewSet):
+    """
+    Вьюсет для работы с ингредиентами.
+    Список и автодополнение по параметру "name" обслуживаются из индекса в
+    памяти процесса без обращения к БД. Ответы кешируются.
+    """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AdminOrReadOnly, )
     pagination_class = None
-    filterset_class = IngredientFilter
+    reference_cache = ingredient_cache
+    query_budget = 1
+
+    def list(self, request):
+        """Список ингредиентов из кеша отрендеренных ответов."""
+        return self.cached_response(self.search, request)
+
+    def search(self, request):
+        """
+        Список ингредиентов. При переданном "name" возвращает не более
+        "limit" ингредиентов: сначала начинающиеся с "name", затем
+        содержащие его.
+        """
+        name = request.query_params.get('name', '')
+        if not name.strip():
+            return Response(ingredient_index.all())
+        return Response(
+            ingredient_index.search(name, get_search_limit(request))
+        )
 
 
-class RecipeViewSet(ModelViewSet, AddDelViewMixin):
+class RecipeViewSet(KeysetPaginationMixin, ModelViewSet, AddDelViewMixin):
     """Вьюсет для работы с рецептами."""
-    queryset = Recipe.objects.select_related('author')
+    queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     add_serializer = RecipeSmallSerializer
     permission_classes = (AuthorAdminOrReadOnly, )
     pagination_class = PageLimitPagination
     filterset_class = RecipeFilter
+    parser_classes = (SizeLimitedJSONParser, )
+    query_budget = {
+        'list': 10,
+        'retrieve': 7,
+        'create': 14,
+        'update': 20,
+        'partial_update': 20,
+        'destroy': 16,
+        'image': 10,
+        'favorite': 6,
+        'favorite_bulk': 5,
+        'shopping_cart': 14,
+        'shopping_cart_bulk': 14,
+        'shopping_cart_summary': 2,
+        'download_shopping_cart': 2,
+    }
+
+    @property
+    def cursor_ordering(self):
+        """
+        Ключ курсорной паджинации: при сортировке "popular" - по
+        популярности, иначе - по дате публикации.
+        """
+        if self.request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return KeysetPaginationMixin.cursor_ordering
+
+    def get_queryset(self):
+        """
+        Выборка рецептов с аннотациями для текущего пользователя и
+        подгруженными связанными объектами.
+        """
+        return self.queryset.for_user(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Страница рецептов с поддержкой условных запросов по ETag.
+        Актуальность страницы проверяется одним лёгким запросом до
+        сериализации. В режиме курсорной паджинации не поддерживается.
+        """
+        if isinstance(self.paginator, KeysetPagination):
+            return super().list(request, *args, **kwargs)
+        page_size = self.paginator.get_page_size(request)
+        page = request.query_params.get(self.paginator.page_query_param, '1')
+        if not page.isdecimal() or int(page) < 1:
+            return super().list(request, *args, **kwargs)
+        start = (int(page) - 1) * page_size
+        versions = list(
+            self.filter_queryset(self.queryset).versions(
+                request.user
+            )[start:start + page_size]
+        )
+        if not versions:
+            return super().list(request, *args, **kwargs)
+        return conditional_response(
+            request,
+            versions,
+            lambda: super(RecipeViewSet, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Рецепт с поддержкой условных запросов по ETag, для анонимных
+        пользователей - также по Last-Modified.
+        """
+        pk = str(kwargs[self.lookup_field])
+        versions = list(
+            self.queryset.filter(pk=pk).versions(request.user)
+        ) if pk.isdecimal() else None
+        if not versions:
+            return super().retrieve(request, *args, **kwargs)
+        return conditional_response(
+            request,
+            versions,
+            lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            versions[0][1] if request.user.is_anonymous else None
+        )
+
+    @action(
+        methods=('PUT', ),
+        detail=True,
+        parser_classes=(SizeLimitedMultiPartParser, )
+    )
+    def image(self, request, pk):
+        """
+        Заменяет изображение рецепта файлом из multipart-запроса (поле
+        "image") без кодирования в base64.
+        """
+        recipe = self.get_object()
+        serializer = RecipeImageSerializer(recipe, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(
+            RecipeSerializer(
+                recipe, context=self.get_serializer_context()
+            ).data
+        )
 
     @action(methods=('GET', 'POST', 'DELETE'), detail=True)
     def favorite(self, request, pk):
@@ -86,23 +249,77 @@ class RecipeViewSet(ModelViewSet, AddDelViewMixin):
         """Добавляет/удалет рецепт в список покупок текущего пользователя."""
         return self.add_del_obj(pk, 'shopping_cart')
 
+    @action(
+        methods=('POST', 'DELETE'),
+        detail=False,
+        url_path='favorite',
+        url_name='favorite-bulk'
+    )
+    def favorite_bulk(self, request):
+        """Добавляет/удалет рецепты в избранное текущего пользователя."""
+        return self.bulk_add_del('favorite')
+
+    @action(
+        methods=('POST', 'DELETE'),
+        detail=False,
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk'
+    )
+    def shopping_cart_bulk(self, request):
+        """
+        Добавляет/удалет рецепты в список покупок текущего пользователя,
+        с "all": true очищает список покупок.
+        """
+        return self.bulk_add_del('shopping_cart')
+
+    def on_add_del(self, manager, obj_ids, added):
+        """Поддерживает итоги списка покупок текущего пользователя."""
+        if manager == 'shopping_cart':
+            ShoppingCartTotal.objects.apply_recipes(
+                (self.request.user.id, ), obj_ids, 1 if added else -1
+            )
+
     @action(methods=('get',), detail=False)
+    def shopping_cart_summary(self, request):
+        """Суммарное количество ингредиентов в списке покупок."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return Response(status=HTTP_401_UNAUTHORIZED)
+        totals = user.cart_totals.select_related(
+            'ingredient'
+        ).order_by('ingredient__name')
+        serializer = ShoppingCartTotalSerializer(totals, many=True)
+        return Response(serializer.data)
+
+    @action(
+        methods=('get',),
+        detail=False,
+        renderer_classes=SHOPPING_LIST_RENDERERS
+    )
     def download_shopping_cart(self, request):
-        """Загружает файл shopping_list.csv со списком ингредиентов."""
+        """
+        Загружает файл shopping_list со списком ингредиентов.
+        Формат выбирается параметром "format": csv (по умолчанию), txt,
+        json или pdf. Строки читаются из БД итератором и отдаются потоком.
+        """
         user = self.request.user
         if not user.is_authenticated:
             return Response(status=HTTP_401_UNAUTHORIZED)
-        if not user.in_cart.exists():
+        ingredients = shopping_list_ingredients(user).iterator()
+        first = next(ingredients, None)
+        if first is None:
             return Response(status=HTTP_400_BAD_REQUEST)
-        ingredients = IngredientAmount.objects.filter(
-            recipe__in=user.in_cart.values('id')
-        ).values(
-            ingredient=F('ingredients__name'),
-            measure=F('ingredients__measurement_unit')
-        ).order_by(
-            'ingredient'
-        ).annotate(
-            sum_amount=Sum('amount')
+        return stream_shopping_list(
+            user,
+            chain((first, ), ingredients),
+            request.accepted_renderer
         )
 
-        return prepare_file(user, ingredients)
+
+class CacheStatsView(APIView):
+    """Счётчики кешей текущего процесса. Доступно администраторам."""
+    permission_classes = (IsAdminUser, )
+    query_budget = 1
+
+    def get(self, request):
+        return Response({'token': token_cache.stats()})
@@ -0,0 +1,25 @@
+"""Модуль описания миксинов моделей, общих для приложений проекта."""
+
+
+class CountersModelMixin:
+    """
+    Миксин моделей со счётчиками, поддерживаемыми атомарными обновлениями
+    F() при добавлении и удалении связей.
+    Сохранение существующего объекта не записывает счётчики, иначе
+    значения, загруженные до сохранения, затёрли бы параллельные изменения.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
@@ -1,5 +1,7 @@
 """Модуль настройки админки для моделей рецептов, ингредиентов и тегов."""
 from django.contrib.admin import ModelAdmin, TabularInline, register
+from django.core.files.storage import default_storage
+from django.db import transaction
 from django.utils.safestring import mark_safe
 
 from .forms import TagForm
@@ -13,20 +15,33 @@ class IngredientAdmin(ModelAdmin):
     """Класс настройки вида админки для ингредиентов."""
     list_display = ('name', 'measurement_unit')
     search_fields = ('name', )
-    list_filter = ('name', )
+    list_filter = ('measurement_unit', )
     empty_value_display = EMPTY_VAL_PLACEHOLDER
     save_on_top = True
+    show_full_result_count = False
 
 
 @register(IngredientAmount)
 class IngredientAmountAdmin(ModelAdmin):
     """Класс настройки вида админки для количества ингредиентов."""
-    pass
+    list_select_related = ('recipe', 'ingredients')
+    autocomplete_fields = ('recipe', 'ingredients')
+    show_full_result_count = False
+
+    def delete_queryset(self, request, queryset):
+        """
+        Удаляет объекты по одному, чтобы изменения попали в итоги списков
+        покупок.
+        """
+        with transaction.atomic():
+            for obj in queryset:
+                obj.delete()
 
 
 class IngredientInline(TabularInline):
     """Класс настройки виджета отображения количества ингредиентов."""
     model = IngredientAmount
+    autocomplete_fields = ('ingredients', )
     extra = 1
 
 
@@ -37,7 +52,7 @@ class RecipeAdmin(ModelAdmin):
         'name',
         'author',
         'getimage',
-        '_get_count_added_to_favorite'
+        'favorites_count'
     )
     fields = (
         ('image', ),
@@ -45,19 +60,21 @@ class RecipeAdmin(ModelAdmin):
         ('tags', 'cooking_time'),
         ('text', )
     )
-    raw_id_fields = ('author', )
-    list_filter = (
-        'name',
-        'author__username',
-        'tags'
-    )
-    search_fields = ('name', 'author')
+    autocomplete_fields = ('author', 'tags')
+    list_select_related = ('author', )
+    list_filter = ('tags', )
+    search_fields = ('name', 'author__username')
     save_on_top = True
     empty_value_display = EMPTY_VAL_PLACEHOLDER
     inlines = (IngredientInline, )
+    show_full_result_count = False
 
     def getimage(self, obj):
-        return mark_safe(f'<img src={obj.image.url} width="80" height="35"')
+        url = obj.image.url
+        thumb = obj.image_renditions.get('thumb')
+        if thumb:
+            url = default_storage.url(thumb['jpeg'])
+        return mark_safe(f'<img src={url} width="80" height="35"')
 
     getimage.short_description = 'Изображение'
 
@@ -78,3 +95,4 @@ class TagAdmin(ModelAdmin):
     search_fields = ('name', )
     save_on_top = True
     empty_value_display = EMPTY_VAL_PLACEHOLDER
+    show_full_result_count = False
@@ -0,0 +1,208 @@
+"""
+Команда генерации синтетических данных для нагрузочного тестирования:
+пользователи, подписки, рецепты с ингредиентами и тегами, избранное и
+списки покупок. При одинаковом "seed" набор данных воспроизводится.
+"""
+from io import BytesIO, StringIO
+from itertools import islice
+from random import Random
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from recipe.models import Ingredient, IngredientAmount, Recipe, Tag
+
+User = get_user_model()
+
+WORDS = (
+    'салат', 'суп', 'пирог', 'рагу', 'каша', 'запеканка', 'омлет', 'плов',
+    'борщ', 'паста', 'рулет', 'котлеты', 'оладьи', 'блины', 'соус', 'жаркое',
+    'домашний', 'быстрый', 'летний', 'острый', 'сырный', 'овощной', 'мясной',
+    'рыбный', 'грибной', 'пряный', 'лёгкий', 'праздничный', 'бабушкин',
+)
+IMAGE_NAME = 'recipe_images/generated.jpg'
+
+
+def batches(objects, size: int):
+    """Делит итерируемый объект на списки длиной не более "size"."""
+    objects = iter(objects)
+    while batch := list(islice(objects, size)):
+        yield batch
+
+
+def pick(random: Random, population: list, low: int, high: int) -> list:
+    """Случайная выборка без повторов длиной от "low" до "high"."""
+    high = min(high, len(population))
+    return random.sample(population, random.randint(min(low, high), high))
+
+
+class Command(BaseCommand):
+    help = 'Generates a reproducible synthetic dataset for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Number of users (default: 100)',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Number of recipes (default: 1000)',
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Maximum subscriptions per user (default: 10)',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Maximum favorite recipes per user (default: 30)',
+        )
+        parser.add_argument(
+            '--cart', type=int, default=8,
+            help='Maximum recipes in a shopping cart per user (default: 8)',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help='Random seed (default: 1)',
+        )
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Username prefix of generated users (default: bench)',
+        )
+        parser.add_argument(
+            '--password', default='bench-password',
+            help='Password of generated users (default: bench-password)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows per INSERT statement (default: 1000)',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete users with the prefix and their data first',
+        )
+
+    def handle(self, *args, **options):
+        started = monotonic()
+        prefix = options['prefix']
+        generated = User.objects.filter(username__startswith=f'{prefix}_')
+        if options['clear']:
+            deleted = generated.count()
+            generated.delete()
+            self.stdout.write(f'users: {deleted} deleted')
+        elif generated.exists():
+            raise CommandError(
+                f'Users with prefix "{prefix}" already exist, '
+                f'use --clear or another --prefix'
+            )
+        tags = list(Tag.objects.values_list('id', flat=True))
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        if not tags or not ingredients:
+            raise CommandError('No tags or ingredients, run load_data first')
+        self.generate(Random(options['seed']), tags, ingredients, options)
+        call_command('recount_counters', stdout=StringIO())
+        call_command('rebuild_cart_totals', stdout=StringIO())
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully generated {options["users"]} users and '
+            f'{options["recipes"]} recipes in {monotonic() - started:.2f} s'
+        ))
+
+    @transaction.atomic
+    def generate(self, random: Random, tags: list, ingredients: list,
+                 options: dict):
+        """Создаёт объекты пачками через bulk_create."""
+        size = options['batch_size']
+        prefix = options['prefix']
+        password = make_password(options['password'])
+        for batch in batches((
+            User(
+                username=f'{prefix}_{number}',
+                email=f'{prefix}_{number}@example.com',
+                first_name=random.choice(WORDS).capitalize(),
+                last_name=random.choice(WORDS).capitalize(),
+                password=password,
+            ) for number in range(options['users'])
+        ), size):
+            User.objects.bulk_create(batch)
+        users = list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('id').values_list('id', flat=True))
+        self.stdout.write(f'users: {len(users)} created')
+
+        self.bulk_links(User.subscription.through, (
+            User.subscription.through(
+                from_foodgramuser_id=user, to_foodgramuser_id=author
+            )
+            for user in users
+            for author in pick(random, users, 0, options['follows'])
+            if author != user
+        ), size, 'subscriptions')
+
+        image = self.save_image()
+        for batch in batches((
+            Recipe(
+                author_id=random.choice(users),
+                name=f'{" ".join(random.sample(WORDS, 3))} {number}',
+                text=' '.join(random.choices(WORDS, k=40)),
+                cooking_time=random.randint(5, 180),
+                image=image,
+            ) for number in range(options['recipes'])
+        ), size):
+            Recipe.objects.bulk_create(batch)
+        generated = Recipe.objects.filter(
+            author__username__startswith=f'{prefix}_'
+        )
+        generated.update_search_vector()
+        recipes = list(generated.order_by('id').values_list('id', flat=True))
+        self.stdout.write(f'recipes: {len(recipes)} created')
+
+        self.bulk_links(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+            for recipe in recipes
+            for tag in pick(random, tags, 1, 3)
+        ), size, 'recipe tags')
+        self.bulk_links(IngredientAmount, (
+            IngredientAmount(
+                recipe_id=recipe,
+                ingredients_id=ingredient,
+                amount=random.randint(1, 500),
+            )
+            for recipe in recipes
+            for ingredient in pick(random, ingredients, 3, 12)
+        ), size, 'ingredient amounts')
+        self.bulk_links(Recipe.favorite.through, (
+            Recipe.favorite.through(recipe_id=recipe, foodgramuser_id=user)
+            for user in users
+            for recipe in pick(random, recipes, 0, options['favorites'])
+        ), size, 'favorites')
+        self.bulk_links(Recipe.shopping_cart.through, (
+            Recipe.shopping_cart.through(
+                recipe_id=recipe, foodgramuser_id=user
+            )
+            for user in users
+            for recipe in pick(random, recipes, 0, options['cart'])
+        ), size, 'shopping carts')
+
+    def bulk_links(self, model, objects, size: int, name: str):
+        """Вставляет строки связей пачками и выводит их количество."""
+        total = 0
+        for batch in batches(objects, size):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+        self.stdout.write(f'{name}: {total} created')
+
+    def save_image(self) -> str:
+        """Сохраняет общее для сгенерированных рецептов изображение."""
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = BytesIO()
+            Image.new('RGB', (1280, 960), (222, 184, 135)).save(
+                buffer, 'JPEG'
+            )
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        return IMAGE_NAME
@@ -1,35 +1,98 @@
-"""Команда загрузки в БД данных из файлов формата *.csv."""
+"""Команда загрузки в БД ингредиентов и тегов из файлов CSV или JSON."""
 import csv
+import json
+from itertools import islice
+from pathlib import Path
+from time import monotonic
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from recipe.models import Ingredient, Tag
 
+SOURCES = (
+    (Ingredient, 'ingredients', ('name', 'measurement_unit')),
+    (Tag, 'tags', ('name', 'slug', 'color')),
+)
 
-class Command(BaseCommand):
-    help = 'Loads ingredients from a csv file'
 
-    def handle(self, *args, **options):
-        with open('./data/ingredients.csv', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                name, unit = row
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=unit
+def read_rows(path: Path, fields: tuple):
+    """
+    Построчно читает файл CSV (колонки в порядке "fields") или JSON
+    (список объектов с ключами "fields"). Пустые строки пропускаются.
+    """
+    if path.suffix.lower() == '.json':
+        with path.open(encoding='utf-8') as file:
+            items = json.load(file)
+        for number, item in enumerate(items, 1):
+            if not all(field in item for field in fields):
+                raise CommandError(
+                    f'{path}, item {number}: expected keys {fields}'
                 )
-        self.stdout.write(
-            self.style.SUCCESS('Successfully loaded ingredients')
-        )
-        with open('./data/tags.csv', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                name, slug, color = row
-                Tag.objects.get_or_create(
-                    name=name,
-                    slug=slug,
-                    color=color
+            yield tuple(item[field] for field in fields)
+        return
+    with path.open(encoding='utf-8', newline='') as file:
+        for number, row in enumerate(csv.reader(file), 1):
+            if not row:
+                continue
+            if len(row) < len(fields):
+                raise CommandError(
+                    f'{path}, line {number}: expected columns {fields}'
                 )
-        self.stdout.write(
-            self.style.SUCCESS('Successfully loaded tags')
+            yield tuple(row[:len(fields)])
+
+
+class Command(BaseCommand):
+    help = 'Loads ingredients and tags from CSV or JSON files in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            type=Path,
+            default=Path('./data/ingredients.csv'),
+            help='Path to ingredients .csv or .json '
+                 '(default: ./data/ingredients.csv)',
+        )
+        parser.add_argument(
+            '--tags',
+            type=Path,
+            default=Path('./data/tags.csv'),
+            help='Path to tags .csv or .json (default: ./data/tags.csv)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per INSERT statement (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        for model, option, fields in SOURCES:
+            path = options[option]
+            if not path.is_file():
+                raise CommandError(f'File not found: {path}')
+            self.load(model, option, path, fields, options['batch_size'])
+
+    @transaction.atomic
+    def load(self, model, name: str, path: Path, fields: tuple,
+             batch_size: int):
+        """
+        Загружает объекты пачками через bulk_create, пропуская уже
+        существующие (ignore_conflicts), поэтому повторный запуск безопасен.
+        """
+        started = monotonic()
+        before = model.objects.count()
+        rows = (
+            model(**dict(zip(fields, (value.strip() for value in row))))
+            for row in read_rows(path, fields)
         )
+        total = 0
+        while batch := list(islice(rows, batch_size)):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+            self.stdout.write(f'{name}: {total} rows processed')
+        created = model.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully loaded {name} from {path}: {created} new of '
+            f'{total} rows in {monotonic() - started:.2f} s'
+        ))
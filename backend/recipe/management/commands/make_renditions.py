@@ -0,0 +1,24 @@
+"""Команда построения уменьшенных копий изображений рецептов."""
+from django.core.management.base import BaseCommand
+
+from recipe.models import Recipe
+from recipe.renditions import make_renditions, needs_renditions
+
+
+class Command(BaseCommand):
+    help = 'Builds missing image renditions for recipes'
+
+    def handle(self, *args, **options):
+        built = 0
+        recipes = Recipe.objects.only('image', 'image_renditions')
+        for recipe in recipes.iterator():
+            if not needs_renditions(recipe):
+                continue
+            try:
+                built += bool(make_renditions(recipe.pk))
+            except OSError as error:
+                self.stderr.write(f'Recipe {recipe.pk}: {error}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully built renditions for {built} '
+                               f'recipes')
+        )
@@ -0,0 +1,39 @@
+"""Команда пересчёта итогов списков покупок."""
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Checks shopping cart totals for drift and rebuilds them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drift, exit with an error if any is found',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Limit to the given user id (can be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        drift = ShoppingCartTotal.objects.drift(user_ids)
+        self.stdout.write(f'Drifted totals: {len(drift)}')
+        if options['check']:
+            if drift:
+                raise CommandError(
+                    f'Shopping cart totals drifted for users: '
+                    f'{sorted({user_id for user_id, _ in drift})}'
+                )
+            self.stdout.write(self.style.SUCCESS('Totals are consistent'))
+            return
+        rows = ShoppingCartTotal.objects.rebuild(user_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {rows} totals')
+        )
@@ -0,0 +1,59 @@
+"""Команда пересчёта счётчиков рецептов и пользователей."""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipe.models import Recipe
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Recipe.favorite.through, 'recipe'),
+    (Recipe, 'in_carts_count', Recipe.shopping_cart.through, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', User.subscription.through, 'to_foodgramuser'),
+)
+
+
+def expected_count(rows, field: str):
+    """Подзапрос количества строк "rows", ссылающихся на объект."""
+    return Coalesce(
+        Subquery(
+            rows.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = 'Checks denormalized popularity counters for drift and recounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drift, exit with an error if any is found',
+        )
+
+    def handle(self, *args, **options):
+        drifted = []
+        for model, counter, rows, field in COUNTERS:
+            expected = expected_count(rows, field)
+            drift = model.objects.annotate(expected=expected).exclude(
+                **{counter: F('expected')}
+            ).count()
+            self.stdout.write(
+                f'{model.__name__}.{counter}: {drift} drifted'
+            )
+            if drift:
+                drifted.append(f'{model.__name__}.{counter}')
+                if not options['check']:
+                    model.objects.update(**{counter: expected})
+        if options['check'] and drifted:
+            raise CommandError(f'Counters drifted: {", ".join(drifted)}')
+        self.stdout.write(self.style.SUCCESS('Counters are consistent'))
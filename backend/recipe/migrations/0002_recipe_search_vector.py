@@ -0,0 +1,70 @@
+# Generated by Django 3.2.13 on 2026-10-18 04:40
+
+import django.contrib.postgres.search
+import django.core.validators
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+SEARCH_INDEXES = (
+    (
+        'recipe_search_vector_gin',
+        'CREATE INDEX IF NOT EXISTS recipe_search_vector_gin '
+        'ON recipe_recipe USING gin (search_vector)',
+    ),
+    (
+        'recipe_name_trgm_gin',
+        'CREATE INDEX IF NOT EXISTS recipe_name_trgm_gin '
+        'ON recipe_recipe USING gin (name gin_trgm_ops)',
+    ),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    """Создаёт GIN-индексы и заполняет поисковый вектор (только PostgreSQL)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, sql in SEARCH_INDEXES:
+        schema_editor.execute(sql)
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Recipe.objects.update(
+        search_vector=(
+            SearchVector('name', weight='A', config='russian')
+            + SearchVector('text', weight='B', config='russian')
+        )
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    """Удаляет GIN-индексы (только PostgreSQL)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientamount',
+            name='amount',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1, 'Не может быть меньше 1.')], verbose_name='Количество'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='cooking_time',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1, 'Блюдо не может готовиться менее 1 минуты.')], verbose_name='Время приготовдения'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
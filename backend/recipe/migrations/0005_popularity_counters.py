@@ -0,0 +1,60 @@
+# Generated by Django 3.2.13 on 2026-10-18 04:53
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_rows(through, field: str):
+    """Подзапрос количества строк связи для объекта внешнего запроса."""
+    return Coalesce(
+        models.Subquery(
+            through.objects.filter(
+                **{field: models.OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=models.Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счётчики по существующим данным."""
+    Recipe = apps.get_model('recipe', 'Recipe')
+    User = apps.get_model('users', 'FoodgramUser')
+    Recipe.objects.update(
+        favorites_count=count_rows(Recipe.favorite.through, 'recipe'),
+        in_carts_count=count_rows(Recipe.shopping_cart.through, 'recipe'),
+    )
+    User.objects.update(
+        recipes_count=count_rows(Recipe, 'author'),
+        followers_count=count_rows(
+            User.subscription.through, 'to_foodgramuser'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0004_recipe_updated_at'),
+        ('users', '0002_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлено в избранное, раз'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлено в список покупок, раз'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
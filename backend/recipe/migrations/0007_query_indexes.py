@@ -0,0 +1,73 @@
+# Generated by Django 3.2.13 on 2026-10-18 05:18
+
+from django.db import migrations, models
+
+# Обратные индексы промежуточных таблиц ManyToMany: уникальные ограничения
+# таблиц начинаются с рецепта (подписчика), выборки "избранное / список
+# покупок пользователя", "рецепты тега" и "подписчики автора" идут
+# с другой стороны связи.
+THROUGH_INDEXES = (
+    ('recipe', 'Recipe', 'favorite', 'recipe_favorite_user_idx',
+     ('foodgramuser', 'recipe')),
+    ('recipe', 'Recipe', 'shopping_cart', 'recipe_cart_user_idx',
+     ('foodgramuser', 'recipe')),
+    ('recipe', 'Recipe', 'tags', 'recipe_tags_tag_idx',
+     ('tag', 'recipe')),
+    ('users', 'FoodgramUser', 'subscription', 'user_subscription_author_idx',
+     ('to_foodgramuser', 'from_foodgramuser')),
+)
+
+# Функциональный индекс для поиска ингредиента по началу названия
+# без учёта регистра (name__istartswith), только PostgreSQL.
+INGREDIENT_NAME_INDEX = 'ingredient_name_upper_idx'
+
+
+def through_indexes(apps):
+    """Пары (промежуточная модель, индекс) для обратных индексов."""
+    for app_label, model_name, field, name, fields in THROUGH_INDEXES:
+        model = apps.get_model(app_label, model_name)
+        yield (
+            getattr(model, field).through,
+            models.Index(fields=fields, name=name),
+        )
+
+
+def create_indexes(apps, schema_editor):
+    """Создаёт обратные индексы и функциональный индекс ингредиентов."""
+    for through, index in through_indexes(apps):
+        schema_editor.add_index(through, index)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_INDEX} '
+            f'ON recipe_ingredient (UPPER(name::text) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    """Удаляет индексы, созданные create_indexes."""
+    for through, index in through_indexes(apps):
+        schema_editor.remove_index(through, index)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0006_recipe_image_renditions'),
+        ('users', '0002_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -1,13 +1,25 @@
 """Модуль описания моделей и их настроек для приложения recipe."""
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField,
+                                            TrigramSimilarity)
 from django.core.validators import MinValueValidator
-from django.db.models import (CASCADE, CharField, DateTimeField, ForeignKey,
-                              ImageField, ManyToManyField, Model,
-                              PositiveIntegerField, SlugField, TextField,
-                              UniqueConstraint)
+from django.db import connection, transaction
+from django.db.models import (CASCADE, BooleanField, Case, CharField, Count,
+                              DateTimeField, Exists, F, FloatField,
+                              ForeignKey, ImageField, Index, IntegerField,
+                              JSONField, ManyToManyField, Model, OuterRef,
+                              PositiveIntegerField, Prefetch, Q, QuerySet,
+                              SlugField, Subquery, Sum, TextField,
+                              UniqueConstraint, Value, When, Window)
+from django.utils import timezone
+
+from foodgram.mixins import CountersModelMixin
 
 User = get_user_model()
 
+SEARCH_CONFIG = 'russian'
+
 
 class Ingredient(Model):
     """Модель ингредиента."""
@@ -62,6 +74,59 @@ class IngredientAmount(Model):
     def __str__(self) -> str:
         return f'{self.recipe}: {self.amount}, {self.ingredients}'
 
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет количество ингредиента, переносит изменение в итоги
+        списков покупок, содержащих рецепт, и обновляет дату изменения
+        рецепта (правка через админку). Массовые операции API делают это
+        сами.
+        """
+        with transaction.atomic():
+            deltas = {}
+            if self.pk is not None:
+                previous = IngredientAmount.objects.filter(
+                    pk=self.pk
+                ).values_list('recipe_id', 'ingredients_id', 'amount').first()
+                if previous is not None:
+                    recipe_id, ingredient_id, amount = previous
+                    deltas.setdefault(recipe_id, {})[ingredient_id] = -amount
+            super().save(*args, **kwargs)
+            recipe_deltas = deltas.setdefault(self.recipe_id, {})
+            recipe_deltas[self.ingredients_id] = (
+                recipe_deltas.get(self.ingredients_id, 0) + int(self.amount)
+            )
+            self.apply_changes(deltas)
+
+    def delete(self, *args, **kwargs):
+        """
+        Удаляет количество ингредиента, вычитает его из итогов и обновляет
+        дату изменения рецепта.
+        """
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.apply_changes(
+                {self.recipe_id: {self.ingredients_id: -self.amount}}
+            )
+        return result
+
+    @staticmethod
+    def apply_changes(deltas: dict) -> None:
+        """
+        Прибавляет изменения {id рецепта: {id ингредиента: изменение}} к
+        итогам пользователей, у которых рецепт в списке покупок, и
+        обновляет дату изменения затронутых рецептов (ETag ответов).
+        """
+        Recipe.objects.filter(pk__in=deltas).update(
+            updated_at=timezone.now()
+        )
+        for recipe_id, recipe_deltas in deltas.items():
+            ShoppingCartTotal.objects.apply_delta(
+                Recipe.shopping_cart.through.objects.filter(
+                    recipe_id=recipe_id
+                ).values_list('foodgramuser_id', flat=True),
+                recipe_deltas
+            )
+
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Количество ингредиентов'
@@ -101,7 +166,152 @@ class Tag(Model):
         ordering = ('name',)
 
 
-class Recipe(Model):
+class RecipeQuerySet(QuerySet):
+    """
+    Набор запросов для рецептов.
+    Подготавливает выборку для чтения так, чтобы связанные данные
+    загружались фиксированным числом запросов независимо от размера страницы.
+    """
+
+    def add_user_annotations(self, user):
+        """
+        Аннотирует рецепты признаками "is_favorited" и "is_in_shopping_cart"
+        для переданного пользователя через подзапросы EXISTS.
+        """
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        favorite = self.model.favorite.through.objects.filter(
+            recipe=OuterRef('pk'),
+            foodgramuser=user,
+        )
+        shopping_cart = self.model.shopping_cart.through.objects.filter(
+            recipe=OuterRef('pk'),
+            foodgramuser=user,
+        )
+        return self.annotate(
+            is_favorited=Exists(favorite),
+            is_in_shopping_cart=Exists(shopping_cart),
+        )
+
+    @staticmethod
+    def _is_subscribed(user, author: str):
+        """
+        Выражение признака подписки переданного пользователя на автора,
+        на которого указывает поле "author" внешнего запроса.
+        """
+        if user.is_anonymous:
+            return Value(False, output_field=BooleanField())
+        return Exists(
+            User.subscription.through.objects.filter(
+                from_foodgramuser=user,
+                to_foodgramuser=OuterRef(author),
+            )
+        )
+
+    def with_related(self, user):
+        """
+        Подгружает теги, ингредиенты с количеством и автора с признаком
+        подписки на него переданного пользователя.
+        """
+        return self.prefetch_related(
+            'tags',
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=self._is_subscribed(user, 'pk')
+                ),
+            ),
+            Prefetch(
+                'ingredient',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredients'
+                ).order_by('ingredients__name'),
+            ),
+        )
+
+    def for_user(self, user):
+        """Выборка рецептов для чтения текущим пользователем."""
+        return self.add_user_annotations(user).with_related(user)
+
+    def versions(self, user):
+        """
+        Лёгкая выборка для проверки актуальности ответа без сериализации:
+        идентификатор, дата изменения и признаки переданного пользователя
+        по каждому рецепту, а также размер всей выборки (оконной функцией).
+        """
+        return self.add_user_annotations(user).annotate(
+            is_subscribed=self._is_subscribed(user, 'author'),
+            total=Window(Count('pk')),
+        ).values_list(
+            'pk',
+            'updated_at',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'is_subscribed',
+            'total',
+        )
+
+    def latest_per_author(self, limit: int):
+        """
+        Оставляет не более "limit" последних рецептов каждого автора.
+        Отбор выполняется в одном запросе коррелированным подзапросом,
+        поэтому подходит для Prefetch по списку авторов.
+        """
+        latest = self.model.objects.filter(
+            author=OuterRef('author'),
+        ).order_by('-pub_date').values('pk')[:limit]
+        return self.filter(pk__in=Subquery(latest)).order_by('-pub_date')
+
+    def search(self, value: str):
+        """
+        Полнотекстовый поиск по названию и описанию рецепта.
+        В PostgreSQL используется поле "search_vector" и триграммное сходство
+        названия, результаты упорядочены по релевантности. В остальных СУБД
+        выполняется поиск вхождения каждого слова в название или описание,
+        совпадения в названии выводятся первыми.
+        """
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(
+                value, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return self.filter(
+                Q(search_vector=query) | Q(name__trigram_similar=value)
+            ).annotate(
+                rank=(
+                    SearchRank(F('search_vector'), query)
+                    + TrigramSimilarity('name', value)
+                )
+            ).order_by('-rank', '-pub_date')
+        words = value.split()
+        queryset = self
+        for word in words:
+            queryset = queryset.filter(
+                Q(name__icontains=word) | Q(text__icontains=word)
+            )
+        return queryset.annotate(
+            rank=Case(
+                When(name__icontains=value, then=Value(1.0)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        ).order_by('-rank', '-pub_date')
+
+    def update_search_vector(self):
+        """Пересчитывает поле "search_vector" для рецептов выборки."""
+        if connection.vendor != 'postgresql':
+            return 0
+        return self.update(
+            search_vector=(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+            )
+        )
+
+
+class Recipe(CountersModelMixin, Model):
     """Модель рецепта."""
     author = ForeignKey(
         to=User,
@@ -130,6 +340,11 @@ class Recipe(Model):
         verbose_name='Изображение',
         upload_to='recipe_images/'
     )
+    image_renditions = JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        editable=False
+    )
     name = CharField(
         verbose_name='Название рецепта',
         max_length=200
@@ -138,6 +353,10 @@ class Recipe(Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
     shopping_cart = ManyToManyField(
         to=User,
         verbose_name='Список покупок',
@@ -151,12 +370,25 @@ class Recipe(Model):
     text = TextField(
         verbose_name='Описание рецепта',
     )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    favorites_count = PositiveIntegerField(
+        verbose_name='Добавлено в избранное, раз',
+        default=0,
+        editable=False
+    )
+    in_carts_count = PositiveIntegerField(
+        verbose_name='Добавлено в список покупок, раз',
+        default=0,
+        editable=False
+    )
 
-    def _get_count_added_to_favorite(self):
-        return self.favorite.count()
+    objects = RecipeQuerySet.as_manager()
 
-    _get_count_added_to_favorite.short_description = ('Добавлено в избранное'
-                                                      ', раз')
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     def __str__(self) -> str:
         return self.name
@@ -165,9 +397,196 @@ class Recipe(Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            Index(
+                name='recipe_popular_idx',
+                fields=('-favorites_count', '-pub_date', '-id')
+            ),
+            Index(
+                name='recipe_pub_date_idx',
+                fields=('-pub_date', '-id')
+            ),
+            Index(
+                name='recipe_author_pub_date_idx',
+                fields=('author', '-pub_date', '-id')
+            ),
+        )
         constraints = (
             UniqueConstraint(
                 name='unique_per_author',
                 fields=('name', 'author')
             ),
         )
+
+
+class ShoppingCartTotalQuerySet(QuerySet):
+    """
+    Набор запросов для итогов списка покупок.
+    Содержит методы поддержания итогов при изменении списка покупок
+    пользователей и состава рецептов в нём.
+    """
+
+    def apply_delta(self, user_ids, deltas: dict) -> None:
+        """
+        Прибавляет к итогам пользователей "user_ids" количества из словаря
+        {id ингредиента: изменение количества}. Строки пользователей
+        блокируются до конца транзакции, чтобы параллельные изменения
+        одного списка покупок выполнялись последовательно.
+        """
+        user_ids = list(user_ids)
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            list(
+                User.objects.select_for_update().filter(
+                    id__in=user_ids
+                ).values_list('id', flat=True)
+            )
+            totals = self.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas.keys()
+            )
+            existing = set(totals.values_list('user_id', 'ingredient_id'))
+            if existing:
+                totals.update(
+                    total_amount=F('total_amount') + Case(
+                        *(
+                            When(ingredient_id=key, then=Value(value))
+                            for key, value in deltas.items()
+                        ),
+                        default=Value(0),
+                        output_field=IntegerField(),
+                    )
+                )
+            self.bulk_create(
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=key,
+                    total_amount=value,
+                )
+                for user_id in user_ids
+                for key, value in deltas.items()
+                if (user_id, key) not in existing
+            )
+            totals.filter(total_amount__lte=0).delete()
+
+    def apply_recipe(self, user_ids, recipe_id: int, sign: int = 1) -> None:
+        """
+        Добавляет (sign=1) или вычитает (sign=-1) ингредиенты рецепта из
+        итогов пользователей "user_ids".
+        """
+        self.apply_recipes(user_ids, (recipe_id, ), sign)
+
+    def apply_recipes(self, user_ids, recipe_ids, sign: int = 1) -> None:
+        """
+        Добавляет (sign=1) или вычитает (sign=-1) суммарные количества
+        ингредиентов рецептов "recipe_ids" из итогов пользователей
+        "user_ids".
+        """
+        amounts = IngredientAmount.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredients_id').annotate(
+            total=Sum('amount')
+        ).order_by().values_list('ingredients_id', 'total')
+        self.apply_delta(
+            user_ids, {key: sign * value for key, value in amounts}
+        )
+
+    def expected(self, user_ids=None):
+        """
+        Итоги, рассчитанные по текущему содержимому списков покупок:
+        выборка словарей с ключами "user", "ingredient" и "total".
+        """
+        conditions = {'recipe__shopping_cart__isnull': False}
+        if user_ids is not None:
+            conditions['recipe__shopping_cart__in'] = user_ids
+        # Условия по многозначной связи задаются одним вызовом filter():
+        # каждый следующий вызов добавил бы ещё одно соединение со списками
+        # покупок и умножил суммы на количество других пользователей.
+        return IngredientAmount.objects.filter(**conditions).values(
+            user=F('recipe__shopping_cart'),
+            ingredient=F('ingredients'),
+        ).annotate(
+            total=Sum('amount')
+        ).order_by()
+
+    def drift(self, user_ids=None) -> set:
+        """
+        Возвращает множество пар (id пользователя, id ингредиента), итоги
+        по которым расходятся с рассчитанными.
+        """
+        expected = {
+            (row['user'], row['ingredient']): row['total']
+            for row in self.expected(user_ids).iterator()
+        }
+        actual = self.all()
+        if user_ids is not None:
+            actual = actual.filter(user_id__in=user_ids)
+        actual = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in actual.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            ).iterator()
+        }
+        return {
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        }
+
+    def rebuild(self, user_ids=None, batch_size: int = 1000) -> int:
+        """Пересчитывает итоги полностью. Возвращает количество строк."""
+        with transaction.atomic():
+            totals = self.all()
+            if user_ids is not None:
+                totals = totals.filter(user_id__in=user_ids)
+            totals.delete()
+            created = self.bulk_create(
+                (
+                    self.model(
+                        user_id=row['user'],
+                        ingredient_id=row['ingredient'],
+                        total_amount=row['total'],
+                    )
+                    for row in self.expected(user_ids).iterator()
+                ),
+                batch_size=batch_size,
+            )
+        return len(created)
+
+
+class ShoppingCartTotal(Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается при добавлении/удалении рецептов в список покупок и
+    при изменении состава рецептов, находящихся в нём.
+    """
+    user = ForeignKey(
+        to=User,
+        on_delete=CASCADE,
+        related_name='cart_totals',
+        verbose_name='Пользователь',
+    )
+    ingredient = ForeignKey(
+        to=Ingredient,
+        on_delete=CASCADE,
+        related_name='cart_totals',
+        verbose_name='Ингредиент',
+    )
+    total_amount = IntegerField(
+        verbose_name='Суммарное количество',
+    )
+
+    objects = ShoppingCartTotalQuerySet.as_manager()
+
+    def __str__(self) -> str:
+        return f'{self.user}: {self.ingredient}, {self.total_amount}'
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = (
+            UniqueConstraint(
+                name='unique_cart_total_per_ingredient',
+                fields=('user', 'ingredient'),
+            ),
+        )
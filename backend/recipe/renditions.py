@@ -0,0 +1,138 @@
+"""
+Модуль подготовки уменьшенных копий (рендишенов) изображений рецептов.
+Копии строятся в пуле рабочих потоков после фиксации транзакции, чтобы
+изменение размеров не выполнялось в потоке обработки запроса.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from os.path import basename, splitext
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+RENDITIONS = {
+    'thumb': (160, 160),
+    'card': (640, 480),
+    'detail': (1280, 960),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+RENDITIONS_PATH = 'recipe_images/renditions/'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Возвращает пул рабочих потоков, создавая его при первом вызове."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_RENDITION_WORKERS,
+                thread_name_prefix='renditions',
+            )
+    return _executor
+
+
+def needs_renditions(recipe) -> bool:
+    """Проверяет, построены ли копии для текущего изображения рецепта."""
+    return bool(recipe.image) and (
+        recipe.image_renditions.get('source') != recipe.image.name
+    )
+
+
+def schedule_renditions(recipe) -> None:
+    """
+    Ставит построение копий изображения рецепта в очередь пула после
+    фиксации транзакции. При IMAGE_RENDITION_WORKERS = 0 копии строятся
+    сразу в текущем потоке.
+    """
+    if settings.IMAGE_RENDITION_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(run_in_worker, recipe.pk)
+        )
+    else:
+        transaction.on_commit(lambda: build_renditions(recipe.pk))
+
+
+def build_renditions(recipe_id: int) -> None:
+    """Строит копии, ошибки записываются в журнал."""
+    try:
+        make_renditions(recipe_id)
+    except Exception:
+        logger.exception('Image renditions failed for recipe %s', recipe_id)
+
+
+def run_in_worker(recipe_id: int) -> None:
+    """Строит копии в рабочем потоке с собственным соединением с БД."""
+    close_old_connections()
+    try:
+        build_renditions(recipe_id)
+    finally:
+        close_old_connections()
+
+
+def render(image: Image.Image, size: tuple, image_format: str,
+           options: dict) -> bytes:
+    """Уменьшает изображение до размеров "size" и кодирует его."""
+    copy = image.copy()
+    copy.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    copy.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def make_renditions(recipe_id: int) -> dict:
+    """
+    Строит копии изображения рецепта всех размеров и форматов, сохраняет
+    их пути в поле "image_renditions" и удаляет копии прежнего изображения.
+    Если изображение успели заменить, результат отбрасывается.
+    """
+    from .models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_renditions'
+    ).first()
+    if recipe is None or not needs_renditions(recipe):
+        return {}
+    source = recipe.image.name
+    with default_storage.open(source) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image = image.convert('RGB')
+    stem = splitext(basename(source))[0]
+    renditions = {'source': source}
+    for name, size in RENDITIONS.items():
+        renditions[name] = {
+            extension: default_storage.save(
+                f'{RENDITIONS_PATH}{stem}_{name}.{extension}',
+                ContentFile(render(image, size, image_format, options))
+            )
+            for extension, (image_format, options) in FORMATS.items()
+        }
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_renditions=renditions,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        delete_renditions(renditions)
+        return {}
+    delete_renditions(recipe.image_renditions)
+    return renditions
+
+
+def delete_renditions(renditions: dict) -> None:
+    """Удаляет файлы копий из хранилища."""
+    for name in RENDITIONS:
+        for path in renditions.get(name, {}).values():
+            default_storage.delete(path)
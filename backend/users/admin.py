@@ -12,7 +12,9 @@ class FoodgramUserAdmin(UserAdmin):
         'username',
         'email',
         'first_name',
-        'last_name'
+        'last_name',
+        'recipes_count',
+        'followers_count'
     )
     fieldsets = (
         (
@@ -41,8 +43,9 @@ class FoodgramUserAdmin(UserAdmin):
         'email'
     )
     list_filter = (
-        'username',
-        'first_name',
-        'email'
+        'is_staff',
+        'is_superuser',
+        'is_active'
     )
     save_on_top = True
+    show_full_result_count = False
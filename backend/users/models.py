@@ -1,16 +1,18 @@
 """Модуль содержащий модель пользователя и её настройки."""
 from django.contrib.auth.models import AbstractUser
 from django.db.models import (CharField, CheckConstraint, EmailField,
-                              ManyToManyField, Q)
+                              ManyToManyField, PositiveIntegerField, Q)
 from django.db.models.functions import Length
 from django.utils.translation import gettext_lazy
 
+from foodgram.mixins import CountersModelMixin
+
 from .validators import MinLengthValidator, RegexValidator
 
 CharField.register_lookup(Length)
 
 
-class FoodgramUser(AbstractUser):
+class FoodgramUser(CountersModelMixin, AbstractUser):
     """
     Модель пользователя, настроенная в соотвтетствии с техническим заданием.
     """
@@ -54,6 +56,18 @@ class FoodgramUser(AbstractUser):
         to='self',
         symmetrical=False
     )
+    recipes_count = PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False
+    )
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     class Meta:
         verbose_name = 'Пользователь'